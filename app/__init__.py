@@ -1,45 +1,15 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from .utils import init_db_config, init_uploads_folder, init_secret_key
-import dotenv, markdown, os
-
-# set the project root directory as an environment variable to be used in other modules
-os.environ["PROJECT_ROOT"] = os.path.abspath(
-    os.path.join(os.path.abspath(os.path.dirname(__file__)), os.pardir)
-)
-os.environ["ENV_PATH"] = os.path.join(os.environ.get("PROJECT_ROOT"), ".env")
-check_for_dotenv = os.path.exists(os.environ.get("ENV_PATH"))
-print(f"checking if .env file exists: {check_for_dotenv}")
-
-# load or create .env file
-if check_for_dotenv:
-    # if the .env file exists, load it into the environment
-    dotenv.load_dotenv(dotenv_path=os.environ.get("ENV_PATH"))
-else:
-    # create a .env file if it does not exist
-    with open(os.environ.get("ENV_PATH"), "w") as f:
-        f.write("")
-
-# run the configuration functions
-init_db_config()
-init_uploads_folder()
-init_secret_key()
-
-
-# initialize the app configuration with the utils module and Config class
-class Config:
-    SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI")
-    UPLOADS_FOLDER = os.environ.get("UPLOADS_FOLDER")
-    SECRET_KEY = os.environ.get("SECRET_KEY")
-    SQLALCHEMY_TRACK_MODIFICATIONS = (
-        os.environ.get("SQLALCHEMY_TRACK_MODIFICATIONS") or False
-    )
-    SQLALCHEMY_ECHO = os.environ.get("SQLALCHEMY_ECHO") or False
-
+from .utils import get_settings, human_readable_size, render_markdown, BlobStore
+from .utils import configure_engine, engine_options, pool_collector
+from .audit import AuditLog
+from .metrics import Metrics
+from .cache import Cache
+from .auth import LoginThrottle, TokenAuth
+import logging, os
 
-# create an instance of the Config class
-conf = Config()
+logger = logging.getLogger(__name__)
 
 # initialize the database
 db: SQLAlchemy = SQLAlchemy()
@@ -50,25 +20,77 @@ login_manager = LoginManager()
 # set the login view for the login manager
 login_manager.login_view = "routes.login"
 
+# initialize the content addressed store for uploaded files
+blob_store = BlobStore()
+
+# initialize the batched writer for download, upload and deletion records
+audit_log = AuditLog()
+
+# initialize the request and query instrumentation
+metrics = Metrics()
+
+# initialize the read cache for the listing endpoints
+cache = Cache()
+
+# initialize the bearer token authentication and the login throttle
+token_auth = TokenAuth()
+login_throttle = LoginThrottle()
+
 # Add Jinja2 filter for Markdown conversion
 def markdown_filter(content):
-    return markdown.markdown(content)
+    return render_markdown(content)
 
 
 # create the app factory function and register the blueprints and database
-def create_app():
+def create_app(settings=None, **overrides):
     # create the flask app instance
     app = Flask(__name__)
 
-    # load the app configuration
-    app.config.from_object(Config)
+    # load the app configuration, resolved from the environment once per process
+    app.config.from_object(settings or get_settings())
+    app.config.update(overrides)
+    if (
+        "SQLALCHEMY_DATABASE_URI" in overrides
+        and "SQLALCHEMY_ENGINE_OPTIONS" not in overrides
+    ):
+        # the settings built the pool options for the environment's database
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+            overrides["SQLALCHEMY_DATABASE_URI"], os.environ
+        )
 
     # initialize the database
     db.init_app(app)
 
+    # initialize the migrations (`flask db upgrade`), batch mode lets sqlite alter
+    # existing tables. imported here, alembic would double the cost of `import app`
+    from flask_migrate import Migrate
+
+    Migrate(
+        app,
+        db,
+        directory=os.path.join(os.path.dirname(app.root_path), "migrations"),
+        render_as_batch=True,
+    )
+
     # initialize the login manager
     login_manager.init_app(app)
 
+    # initialize bearer tokens and login throttling
+    token_auth.init_app(app)
+    login_throttle.init_app(app)
+
+    # initialize the blob store inside the uploads folder
+    blob_store.init_app(app)
+
+    # initialize the audit log writer
+    audit_log.init_app(app)
+
+    # initialize the instrumentation and the /metrics endpoint
+    metrics.init_app(app)
+
+    # initialize the listing cache, its counters are exposed through /metrics
+    cache.init_app(app)
+
     # using the app context, register the blueprints and models
     with app.app_context():
 
@@ -81,15 +103,23 @@ def create_app():
         app.register_blueprint(routes.endpoint)
         app.register_blueprint(api.endpoint)
 
+        # register the cli commands
+        from .commands import files_cli, notes_cli, serve, init_db_command
+
+        app.cli.add_command(files_cli)
+        app.cli.add_command(notes_cli)
+        app.cli.add_command(serve)
+        app.cli.add_command(init_db_command)
+
         # Register the markdown filter with the app
         app.jinja_env.filters["markdown"] = markdown_filter
+        app.jinja_env.filters["filesize"] = human_readable_size
+
+        # apply the sqlite pragmas and expose the pool statistics on /metrics
+        configure_engine(db.engine, app.config)
+        metrics.add_collector(app, pool_collector(db.engine))
 
-        # create the database tables if they do not exist
-        db.create_all()
+        # tables and search indexes are created by `flask init-db`, not on every start
 
         # return the app instance
         return app
-
-
-# create the app instance
-app = create_app()
@@ -7,12 +7,20 @@ from .api_files import (
     delete_file as delete_file,
     edit_file as edit_file,
     download_file as download_file,
+    get_user_usage as get_user_usage,
+    get_largest_files as get_largest_files,
+    get_popular_files as get_popular_files,
+    get_usage_by_user as get_usage_by_user,
+    get_usage_by_type as get_usage_by_type,
+    export_files as export_files,
 )
 
 from .api_auth import (
     login as login,
     logout as logout,
     register as register,
+    issue_token as issue_token,
+    revoke_token as revoke_token,
 )
 
 from .api_index import (
@@ -25,4 +33,13 @@ from .api_notes import (
     edit_note as edit_note,
     delete_note as delete_note,
     get_user_notes as get_user_notes,
+    bulk_add_notes as bulk_add_notes,
+    export_notes as export_notes,
+)
+
+from .api_uploads import (
+    init_upload as init_upload,
+    upload_status as upload_status,
+    upload_chunk as upload_chunk,
+    finalize_upload as finalize_upload,
 )
@@ -1,5 +1,6 @@
 from flask import jsonify, request, Response
-from flask_login import current_user, login_user, logout_user
+from flask_login import current_user, login_required, login_user, logout_user
+from app import login_throttle, token_auth
 from app.models import User
 from . import endpoint
 
@@ -7,9 +8,29 @@ __all__ = [
     "login",
     "logout",
     "register",
+    "issue_token",
+    "revoke_token",
 ]
 
 
+def _throttled(username: str):
+    retry_after = login_throttle.retry_after(username, request.remote_addr)
+    if retry_after:
+        response = jsonify(error="Too many failed login attempts")
+        response.headers["Retry-After"] = str(retry_after)
+        return response, 429
+    return None
+
+
+def _authenticate(username: str, password: str):
+    user = User.query.filter_by(username=username).first()
+    if user is None or not user.check_password(password):
+        login_throttle.failed(username, request.remote_addr)
+        return None
+    login_throttle.succeeded(username, request.remote_addr)
+    return user
+
+
 @endpoint.route("/api/login", methods=["POST"])
 def login():
     if current_user.is_authenticated:
@@ -19,14 +40,46 @@ def login():
     password = request.json["password"]
     remember_me = request.json["remember_me"]
 
-    user = User.query.filter_by(username=username).first()
-    if user is None or not user.check_password(password):
+    throttled = _throttled(username)
+    if throttled:
+        return throttled
+    user = _authenticate(username, password)
+    if user is None:
         return jsonify(error="Invalid username or password"), 401
 
     login_user(user, remember=remember_me)
     return jsonify(message="Logged in successfully")
 
 
+@endpoint.route("/api/token", methods=["POST"])
+def issue_token():
+    username = request.json["username"]
+    password = request.json["password"]
+
+    throttled = _throttled(username)
+    if throttled:
+        return throttled
+    user = _authenticate(username, password)
+    if user is None:
+        return jsonify(error="Invalid username or password"), 401
+
+    return jsonify(
+        token=token_auth.issue(user),
+        token_type="Bearer",
+        expires_in=token_auth.max_age,
+    )
+
+
+@endpoint.route("/api/token/revoke", methods=["POST"])
+@login_required
+def revoke_token() -> Response:
+    token_id = getattr(current_user, "token_id", None)
+    if token_id is None:
+        return jsonify(error="Not authenticated with a token"), 400
+    token_auth.revoke(token_id)
+    return jsonify(message="Token revoked")
+
+
 @endpoint.route("/api/logout", methods=["GET"])
 def logout() -> Response:
     logged_out = logout_user()
@@ -47,9 +100,9 @@ def register():
 
     user = User(username=username, email=email)
     user.set_password(password)
-    first_admin = User.query.filter_by(is_admin=True).first()
+    first_admin = User.query.filter_by(admin=True).first()
     if not first_admin:
-        user.is_admin = True
+        user.admin = True
 
     user.save()
     if User.query.count() == 1:
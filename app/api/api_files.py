@@ -1,12 +1,12 @@
-from flask import request, jsonify, send_from_directory, Response
+from flask import current_app, request, jsonify, Response, stream_with_context
 from flask_login import current_user, login_required
-from app.models import File, Upload, Download, User, Deletion
+from app.bulk import EXPORT_FORMATS, export_files as stream_files
+from app.models import File, Upload, Download, Deletion
+from app.utils import send_stored_file, counts_as_download, stream_json, wants_stream
+from app.utils import decode_cursor, next_cursor, search_window
 from werkzeug.utils import secure_filename as s_fn
-import os
 from . import endpoint
 
-_upload_folder: str = os.environ.get("UPLOAD_FOLDER")
-
 
 @endpoint.route("/api/file/upload", methods=["POST"])
 def upload_file():
@@ -26,15 +26,13 @@ def upload_file():
             else:
                 return jsonify(error="Failed to create new file"), 400
 
-            new_upload = Upload(new_file.id, current_user.id)
-            saved = new_upload.save()
+            saved = Upload.record_upload(current_user.id, new_file.id)
         else:
             new_file: File = File.query.filter_by(file_name=secure_filename).first()
-            new_upload = Upload(file_id=new_file.id)
-            saved = new_upload.save()
+            saved = Upload.record_upload(None, new_file.id)
 
         if saved and new_file.id is not None:
-            uploaded_file.save(os.path.join(_upload_folder, secure_filename))
+            new_file.store_upload(uploaded_file.stream)
             return jsonify(message="File uploaded successfully"), 201
 
         return jsonify(error="File upload failed"), 400
@@ -45,10 +43,88 @@ def upload_file():
 @endpoint.route("/api/user/files", methods=["GET"])
 @login_required
 def get_user_files() -> Response:
-    files = File.get_all_user_files(current_user.id)
+    # every file unless a limit is given, then page on with next_cursor
+    limit = request.args.get("limit", default=0, type=int)
+    try:
+        cursor = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify(error="Invalid cursor"), 400
+    if wants_stream():
+        return stream_json(
+            "files",
+            File.user_files_query(current_user.id, limit=limit, cursor=cursor),
+            page_size=limit,
+        )
+    files = File.get_all_user_files(current_user.id, limit=limit, cursor=cursor)
+    return jsonify(
+        files=[file.serialize() for file in files],
+        next_cursor=next_cursor(files, limit),
+    )
+
+
+@endpoint.route("/api/user/files/usage", methods=["GET"])
+@login_required
+def get_user_usage() -> Response:
+    return jsonify(total_bytes=File.total_bytes_for_user(current_user.id))
+
+
+@endpoint.route("/api/files/largest", methods=["GET"])
+def get_largest_files() -> Response:
+    id = current_user.id if current_user.is_authenticated else None
+    limit = request.args.get("limit", default=10, type=int)
+    files = File.largest_files(id, limit=limit)
     return jsonify(files=[file.serialize() for file in files])
 
 
+@endpoint.route("/api/files/popular", methods=["GET"])
+def get_popular_files() -> Response:
+    id = current_user.id if current_user.is_authenticated else None
+    limit = request.args.get("limit", default=10, type=int)
+    hours = request.args.get("hours", default=24, type=int)
+    files = File.popular_files(id, limit=limit, hours=hours)
+    return jsonify(
+        files=[
+            dict(file.serialize(), downloads=int(downloads))
+            for file, downloads in files
+        ],
+        hours=hours,
+    )
+
+
+@endpoint.route("/api/files/stats/users", methods=["GET"])
+@login_required
+def get_usage_by_user() -> Response:
+    if not current_user.is_admin():
+        return jsonify(error="You do not have permission to view file stats."), 403
+    return jsonify(
+        users=[
+            {
+                "user_id": user_id,
+                "file_count": file_count,
+                "total_bytes": total_bytes,
+            }
+            for user_id, file_count, total_bytes in File.total_bytes_by_user()
+        ]
+    )
+
+
+@endpoint.route("/api/files/stats/types", methods=["GET"])
+@login_required
+def get_usage_by_type() -> Response:
+    if not current_user.is_admin():
+        return jsonify(error="You do not have permission to view file stats."), 403
+    return jsonify(
+        types=[
+            {
+                "file_type": file_type,
+                "file_count": file_count,
+                "total_bytes": total_bytes,
+            }
+            for file_type, file_count, total_bytes in File.total_bytes_by_type()
+        ]
+    )
+
+
 @endpoint.route("/api/file/<int:file_id>/edit", methods=["PUT"])
 @login_required
 def edit_file(file_id) -> Response:
@@ -67,10 +143,11 @@ def edit_file(file_id) -> Response:
 @login_required
 def delete_file(file_id) -> Response:
     file: File = File.query.get_or_404(file_id)
-    user = User.query.get_or_404(current_user.id)
-    if user.is_admin():
+    if file.deleted:
+        return jsonify(error="File not found"), 404
+    if current_user.is_admin():
         file.delete()
-        Deletion(file_id, current_user.id).save()
+        Deletion.record_deletion(file_id, current_user.id)
         return jsonify(message="Your file has been deleted."), 200
 
     return jsonify(error="You do not have permission to delete this file."), 403
@@ -85,17 +162,43 @@ def download_file(file_id) -> Response:
         or not file.is_private()
         or file.is_anonymous()
     ):
-        Download.record_download(
-            file_id, current_user.id if current_user.is_authenticated else None
-        )
-        return send_from_directory(_upload_folder, file.file_name, as_attachment=True)
+        response = send_stored_file(file, current_app.config["UPLOAD_FOLDER"])
+        if counts_as_download(response):
+            Download.record_download(
+                file_id, current_user.id if current_user.is_authenticated else None
+            )
+        return response
     else:
         return jsonify(error="You do not have permission to download this file."), 403
 
 
+# Endpoint to export the metadata of your files as NDJSON or CSV
+@endpoint.route("/api/files/export", methods=["GET"])
+@login_required
+def export_files() -> Response:
+    fmt = request.args.get("format", default="ndjson")
+    try:
+        chunks = stream_files(fmt, current_user.id)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=files.{fmt}"},
+    )
+
+
 @endpoint.route("/api/file/search", methods=["POST"])
 def search_files() -> Response:
     search_term = request.json["search_term"]
     id = current_user.id if current_user.is_authenticated else None
-    files = File.search(search_term, id)
+    try:
+        limit, skip = search_window(request.json)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    if wants_stream():
+        return stream_json(
+            "files", File.search_query(search_term, id, limit=limit, offset=skip)
+        )
+    files = File.search(search_term, id, limit=limit, offset=skip)
     return jsonify(files=[file.serialize() for file in files] if files else [])
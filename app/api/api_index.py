@@ -1,8 +1,17 @@
 from flask import Response, jsonify, request
 from flask_login import current_user, login_required
+from app import cache
 from app.models import Note, File
+from app.utils import decode_cursor, next_cursor, stream_json, wants_stream
 from . import endpoint
 
+
+def _cache_key(user_id) -> str:
+    # anonymous visitors share one set of pages, signed in users get their own
+    viewer = "anonymous" if user_id is None else f"user:{user_id}"
+    return f"{viewer}:{request.query_string.decode()}"
+
+
 # Endpoint to get notes
 @endpoint.route("/api/notes", methods=["GET"])
 # def get_notes():
@@ -13,8 +22,28 @@ def get_notes() -> Response:
         user_id = None
     limit = request.args.get("limit", default=10, type=int)
     skip = request.args.get("skip", default=0, type=int)
-    notes = Note.index_page_notes(user_id, limit=limit, offset=skip)
-    return jsonify(notes=[note.serialize() for note in notes])
+    try:
+        cursor = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify(error="Invalid cursor"), 400
+    if wants_stream():
+        # large pages are written as they are read instead of being cached
+        return stream_json(
+            "notes",
+            Note.index_page_query(user_id, limit=limit, offset=skip, cursor=cursor),
+            page_size=limit,
+        )
+
+    def produce() -> Response:
+        notes = Note.index_page_notes(
+            user_id, limit=limit, offset=skip, cursor=cursor
+        )
+        return jsonify(
+            notes=[note.serialize() for note in notes],
+            next_cursor=next_cursor(notes, limit),
+        )
+
+    return cache.cached_json("notes", _cache_key(user_id), produce)
 
 
 # Endpoint to get files
@@ -26,5 +55,25 @@ def get_files() -> Response:
         user_id = None
     limit = request.args.get("limit", default=10, type=int)
     skip = request.args.get("skip", default=0, type=int)
-    files = File.return_index_page_files(user_id, limit=limit, offset=skip)
-    return jsonify(files=[file.serialize() for file in files])
+    try:
+        cursor = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify(error="Invalid cursor"), 400
+    if wants_stream():
+        # large pages are written as they are read instead of being cached
+        return stream_json(
+            "files",
+            File.index_page_query(user_id, limit=limit, offset=skip, cursor=cursor),
+            page_size=limit,
+        )
+
+    def produce() -> Response:
+        files = File.return_index_page_files(
+            user_id, limit=limit, offset=skip, cursor=cursor
+        )
+        return jsonify(
+            files=[file.serialize() for file in files],
+            next_cursor=next_cursor(files, limit),
+        )
+
+    return cache.cached_json("files", _cache_key(user_id), produce)
@@ -1,7 +1,10 @@
-from flask import jsonify, request, Response
+from flask import jsonify, request, Response, stream_with_context
 from flask_login import current_user, login_required
 from app import db
+from app.bulk import EXPORT_FORMATS, export_notes as stream_notes, import_notes
 from app.models import Note
+from app.utils import decode_cursor, next_cursor, search_window
+from app.utils import stream_json, wants_stream
 from . import endpoint
 
 __all__ = [
@@ -10,6 +13,8 @@ __all__ = [
     "delete_note",
     "get_user_notes",
     "search_notes",
+    "bulk_add_notes",
+    "export_notes",
 ]
 
 
@@ -22,7 +27,7 @@ def add_note():
     note = Note(
         title=title,
         content=content,
-        author=current_user if current_user.is_authenticated else None,
+        user_id=current_user.id if current_user.is_authenticated else None,
         private=private,
     )
     note.save()
@@ -42,7 +47,7 @@ def edit_note(note_id):
         note.content = content
         note.private = private
 
-        db.session.commit()
+        note.save()
         return jsonify(message="Your note has been updated.")
     else:
         return jsonify(error="You do not have permission to edit this note."), 403
@@ -61,8 +66,23 @@ def delete_note(note_id) -> Response:
 @endpoint.route("/api/user/notes", methods=["GET"])
 @login_required
 def get_user_notes() -> Response:
-    notes = Note.get_user_notes(current_user.id)
-    return jsonify(notes=[note.serialize() for note in notes])
+    # every note unless a limit is given, then page on with next_cursor
+    limit = request.args.get("limit", default=0, type=int)
+    try:
+        cursor = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify(error="Invalid cursor"), 400
+    if wants_stream():
+        return stream_json(
+            "notes",
+            Note.user_notes_query(current_user.id, limit=limit, cursor=cursor),
+            page_size=limit,
+        )
+    notes = Note.get_user_notes(current_user.id, limit=limit, cursor=cursor)
+    return jsonify(
+        notes=[note.serialize() for note in notes],
+        next_cursor=next_cursor(notes, limit),
+    )
 
 
 @endpoint.route("/api/note/search", methods=["POST"])
@@ -72,5 +92,42 @@ def search_notes() -> Response:
         id = current_user.id
     except AttributeError:
         id = None
-    notes = Note.search(search_term, id)
+    try:
+        limit, skip = search_window(request.json)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    if wants_stream():
+        return stream_json(
+            "notes",
+            Note.search_query(search_term, id, limit=limit, offset=skip),
+            search_term=search_term,
+        )
+    notes = Note.search(search_term, id, limit=limit, offset=skip)
     return jsonify(search_term=search_term, notes=[note.serialize() for note in notes])
+
+
+# Endpoint to import notes, one JSON object per line of the request body
+@endpoint.route("/api/notes/bulk", methods=["POST"])
+@login_required
+def bulk_add_notes() -> Response:
+    batch_size = request.args.get("batch_size", default=1000, type=int)
+    result = import_notes(request.stream, current_user.id, batch_size=batch_size)
+    if result["failed"] and not result["imported"]:
+        return jsonify(**result), 400
+    return jsonify(**result)
+
+
+# Endpoint to export your notes as NDJSON or CSV, `flask notes export` exports all
+@endpoint.route("/api/notes/export", methods=["GET"])
+@login_required
+def export_notes() -> Response:
+    fmt = request.args.get("format", default="ndjson")
+    try:
+        chunks = stream_notes(fmt, current_user.id)
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=notes.{fmt}"},
+    )
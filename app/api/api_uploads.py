@@ -0,0 +1,219 @@
+from flask import current_app, request, jsonify, Response
+from flask_login import current_user
+from app import db, blob_store, cache
+from app.models import File, Upload, UploadSession
+from werkzeug.utils import secure_filename as s_fn
+import fcntl, hashlib, os, time
+from contextlib import contextmanager
+from . import endpoint
+
+__all__ = [
+    "init_upload",
+    "upload_status",
+    "upload_chunk",
+    "finalize_upload",
+]
+
+_chunk_size = 1024 * 1024
+
+# session id -> (bytes hashed so far, running sha256, last used), only valid for in
+# order chunks handled by this process. finalize rehashes the file unless the entry
+# covers every received byte, so chunks sent to other workers cost a rehash only
+_hashers = {}
+# entries of sessions abandoned or finished by another worker are dropped after this
+_hasher_max_idle = 3600
+
+
+def _incoming_path(session_id: str) -> str:
+    return os.path.join(
+        current_app.config["UPLOAD_FOLDER"], ".incoming", f"{session_id}.part"
+    )
+
+
+def _prune_hashers() -> None:
+    cutoff = time.monotonic() - _hasher_max_idle
+    for session_id, (_, _, used) in list(_hashers.items()):
+        if used < cutoff:
+            _hashers.pop(session_id, None)
+
+
+def _current_user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+def _get_session(session_id: str):
+    """The upload session if the caller may use it, otherwise None.
+
+    Sessions started without signing in have no owner, the random upload id
+    is what grants access to them, so clients must keep it to themselves.
+    """
+    upload = UploadSession.query.get(session_id)
+    if upload is None or not upload.is_owned_by_user(_current_user_id()):
+        return None
+    return upload
+
+
+@contextmanager
+def _locked_session(session_id: str):
+    # one chunk or finalize per session runs at a time, so the bytes on disk, the
+    # offset and the hash state are only changed by the request holding the lock.
+    # yields the part file and the session reloaded under the lock, or Nones
+    try:
+        fd = os.open(_incoming_path(session_id), os.O_WRONLY)
+    except FileNotFoundError:
+        # finalized or purged in the meantime
+        yield None, None
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        # end the read transaction so the session is read again after the lock
+        db.session.rollback()
+        yield fd, _get_session(session_id)
+    finally:
+        os.close(fd)
+
+
+def _upload_options(data) -> dict:
+    # raises ValueError with the message for a 400
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    size = data.get("size")
+    if size is not None and (
+        not isinstance(size, int) or isinstance(size, bool) or size < 0
+    ):
+        raise ValueError("size must be a non-negative integer")
+    private = data.get("private", current_user.is_authenticated)
+    if not isinstance(private, bool):
+        raise ValueError("private must be true or false")
+    details = data.get("details")
+    if details is not None and (not isinstance(details, str) or len(details) > 200):
+        raise ValueError("details must be a string of at most 200 characters")
+    file_name = data.get("file_name", "")
+    if not isinstance(file_name, str):
+        raise ValueError("file_name must be a string")
+    return {
+        "file_name": s_fn(file_name),
+        "total_size": size,
+        "private": private,
+        "details": details,
+    }
+
+
+@endpoint.route("/api/file/upload/init", methods=["POST"])
+def init_upload() -> Response:
+    try:
+        options = _upload_options(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    if not options["file_name"]:
+        return jsonify(error="No file name given"), 400
+    if File.query.filter_by(file_name=options["file_name"]).first():
+        return jsonify(error="Failed to create new file"), 400
+
+    upload = UploadSession(user_id=_current_user_id(), **options)
+    os.makedirs(os.path.dirname(_incoming_path(upload.id)), exist_ok=True)
+    open(_incoming_path(upload.id), "wb").close()
+    upload.save()
+    _prune_hashers()
+    _hashers[upload.id] = (0, hashlib.sha256(), time.monotonic())
+    return jsonify(upload_id=upload.id, offset=0), 201
+
+
+@endpoint.route("/api/file/upload/<upload_id>", methods=["GET"])
+def upload_status(upload_id) -> Response:
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify(error="Upload not found"), 404
+    return jsonify(upload_id=upload.id, offset=upload.received, size=upload.total_size)
+
+
+@endpoint.route("/api/file/upload/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id) -> Response:
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify(error="Upload not found"), 404
+    offset = request.args.get("offset", default=upload.received, type=int)
+    if offset != upload.received:
+        # the client resumes from the offset we report back
+        return jsonify(error="Offset mismatch", offset=upload.received), 409
+
+    _prune_hashers()
+    # a second request for the same offset waits here and is then turned away,
+    # so the bytes on disk are always those of the request that advanced it
+    with _locked_session(upload_id) as (fd, upload):
+        if upload is None:
+            return jsonify(error="Upload not found"), 404
+        if offset != upload.received:
+            return jsonify(error="Offset mismatch", offset=upload.received), 409
+        hashed, hasher, _ = _hashers.pop(upload.id, (None, None, None))
+        if hashed != offset:
+            hasher = None
+        written = 0
+        while True:
+            chunk = request.stream.read(_chunk_size)
+            if not chunk:
+                break
+            os.pwrite(fd, chunk, offset + written)
+            written += len(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+
+        if upload.total_size is not None and offset + written > upload.total_size:
+            os.ftruncate(fd, offset)
+            return jsonify(error="Chunk exceeds upload size", offset=offset), 400
+        if not upload.advance(offset, written):
+            return jsonify(error="Offset mismatch", offset=upload.received), 409
+    if hasher is not None:
+        _hashers[upload.id] = (upload.received, hasher, time.monotonic())
+    return jsonify(upload_id=upload.id, offset=upload.received)
+
+
+@endpoint.route("/api/file/upload/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id) -> Response:
+    if _get_session(upload_id) is None:
+        return jsonify(error="Upload not found"), 404
+    expected = (request.get_json(silent=True) or {}).get("sha256")
+    if expected is not None and not isinstance(expected, str):
+        return jsonify(error="sha256 must be a string"), 400
+
+    # a chunk still being written would change the bytes that are hashed here
+    with _locked_session(upload_id) as (_, upload):
+        if upload is None:
+            return jsonify(error="Upload not found"), 404
+        if not upload.is_complete():
+            return jsonify(error="Upload is incomplete", offset=upload.received), 409
+        path = _incoming_path(upload.id)
+        hashed, hasher, _ = _hashers.pop(upload.id, (None, None, None))
+        if hashed == upload.received:
+            content_hash = hasher.hexdigest()
+        else:
+            content_hash = blob_store.hash_file(path)
+        if expected and expected.lower() != content_hash:
+            return jsonify(error="Checksum mismatch", sha256=content_hash), 400
+        if File.query.filter_by(file_name=upload.file_name).first():
+            return jsonify(error="Failed to create new file"), 400
+
+        new_file = File(
+            file_name=upload.file_name,
+            user_id=upload.user_id,
+            private=upload.private,
+            details=upload.details,
+        )
+        new_file.set_blob(content_hash, upload.received)
+        # placed once the blob row is locked, see File.store_upload
+        blob_store.store_file(path, content_hash)
+        new_file.file_type = File.type_from_name(upload.file_name)
+        db.session.add(new_file)
+        db.session.flush()
+        db.session.add(Upload(file_id=new_file.id, user_id=upload.user_id))
+        db.session.delete(upload)
+        db.session.commit()
+    cache.invalidate("files")
+    return (
+        jsonify(
+            message="File uploaded successfully",
+            file_id=new_file.id,
+            sha256=content_hash,
+        ),
+        201,
+    )
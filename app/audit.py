@@ -0,0 +1,156 @@
+import atexit, logging, os, queue, threading, time
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLog:
+    """Buffers audit rows (downloads, uploads, deletions) and inserts them in batches.
+
+    Rows are queued in process and written by a background thread once
+    AUDIT_BATCH_SIZE rows are waiting or AUDIT_FLUSH_INTERVAL seconds have passed.
+    When the queue is full the request thread flushes it itself, which slows
+    callers down instead of dropping events. Each row is written to the
+    database of the app that recorded it, one writer serves every app.
+    """
+
+    def __init__(self, app=None) -> None:
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.extensions["audit_log"] = self
+        if self._queue is not None:
+            # the queue, the worker and the exit hook are shared by later apps,
+            # rows already queued for another app are kept
+            return
+        self.batch_size = int(app.config.get("AUDIT_BATCH_SIZE", 200))
+        self.flush_interval = float(app.config.get("AUDIT_FLUSH_INTERVAL", 1.0))
+        self.enqueue_timeout = float(app.config.get("AUDIT_ENQUEUE_TIMEOUT", 0.05))
+        self._queue = queue.Queue(
+            maxsize=int(app.config.get("AUDIT_QUEUE_SIZE", 10000))
+        )
+        atexit.register(self.shutdown)
+
+    def record(self, model, **values) -> None:
+        app = current_app._get_current_object()
+        if not app.config.get("AUDIT_ASYNC", True):
+            self._write([(app, model, values)])
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put((app, model, values), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # backpressure, the caller pays for the flush instead of losing the event
+            self.flush()
+            self._write([(app, model, values)])
+
+    def flush(self) -> None:
+        """Write everything queued so far, including batches the worker is writing."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if batch:
+                self._write(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+        self._queue.join()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self._queue is not None:
+            self.flush()
+
+    def _ensure_worker(self) -> None:
+        # started lazily and per process, threads do not survive a fork
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="audit-log", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception:
+                logger.exception("audit batch lost")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: list) -> None:
+        by_app = {}
+        for app, model, values in batch:
+            by_app.setdefault(app, {}).setdefault(model, []).append(values)
+        for app, grouped in by_app.items():
+            with app.app_context():
+                self._write_grouped(grouped)
+
+    def _write_grouped(self, grouped: dict) -> None:
+        from app import db
+
+        try:
+            for model, rows in grouped.items():
+                self._insert(model, rows)
+            db.session.commit()
+            return
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.exception("audit batch failed, retrying rows one by one")
+        # one bad row (e.g. a duplicate deletion) must not take the batch with it
+        for model, rows in grouped.items():
+            for row in rows:
+                try:
+                    self._insert(model, [row])
+                    db.session.commit()
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    logger.error("dropped audit row %s %s", model.__name__, row)
+
+    @staticmethod
+    def _insert(model, rows: list) -> None:
+        from app import db
+
+        db.session.bulk_insert_mappings(model, rows)
+        # models can maintain derived data (counters, rollups) in the same transaction
+        hook = getattr(model, "after_audit_flush", None)
+        if hook is not None:
+            hook(rows)
@@ -0,0 +1,215 @@
+import logging, threading, time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from flask import current_app
+from flask_login import UserMixin
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class TokenUser(UserMixin):
+    """The user behind a bearer token, built from its claims without a query.
+
+    Only the id comes from the token, any other attribute, is_admin() too,
+    loads the user row on first use, so a revoked admin flag applies at once.
+    """
+
+    def __init__(self, claims: dict) -> None:
+        self.id = claims["uid"]
+        self.token_id = claims["jti"]
+
+    def is_admin(self) -> bool:
+        from app.models import User
+
+        user = User.get_cached(self.id)
+        return user is not None and user.is_admin()
+
+    def get_id(self):
+        return self.id
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        from app.models import User
+
+        user = User.get_cached(self.id)
+        if user is None:
+            raise AttributeError(name)
+        return getattr(user, name)
+
+
+class TokenAuth:
+    """Signed, expiring bearer tokens for the JSON API.
+
+    Tokens are itsdangerous signatures over the user id and a token id, keyed
+    by SECRET_KEY, so any worker can verify them. Revoked token ids are stored
+    in the database and kept in memory, refreshed every
+    API_TOKEN_REVOCATION_REFRESH seconds.
+    """
+
+    # changed from "api-token", tokens signed before the admin flag was read
+    # correctly claimed admin for every user
+    salt = "api-token-v2"
+
+    def __init__(self, app=None) -> None:
+        self._serializer = None
+        self._revoked = {}
+        self._revoked_loaded = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        from app import login_manager
+
+        self._serializer = URLSafeTimedSerializer(
+            app.config["SECRET_KEY"], salt=self.salt
+        )
+        self.max_age = int(app.config.get("API_TOKEN_TTL") or 3600)
+        self.refresh = float(app.config.get("API_TOKEN_REVOCATION_REFRESH") or 30)
+        login_manager.request_loader(self._load_user_from_request)
+        app.extensions["token_auth"] = self
+
+    def issue(self, user) -> str:
+        claims = {"uid": user.id, "jti": uuid4().hex}
+        return self._serializer.dumps(claims)
+
+    def verify(self, token: str):
+        try:
+            claims = self._serializer.loads(token, max_age=self.max_age)
+        except (SignatureExpired, BadSignature):
+            return None
+        if claims.get("jti") in self._revoked_ids():
+            return None
+        return claims
+
+    def revoke(self, token_id: str) -> None:
+        from app.models import RevokedToken
+
+        expires = datetime.utcnow() + timedelta(seconds=self.max_age)
+        RevokedToken.revoke(token_id, expires)
+        with self._lock:
+            self._revoked[token_id] = expires
+
+    def _revoked_ids(self) -> dict:
+        if time.monotonic() - self._revoked_loaded < self.refresh:
+            return self._revoked
+        from app.models import RevokedToken
+
+        with self._lock:
+            if time.monotonic() - self._revoked_loaded >= self.refresh:
+                self._revoked = RevokedToken.active()
+                self._revoked_loaded = time.monotonic()
+        return self._revoked
+
+    def _load_user_from_request(self, request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            return None
+        claims = self.verify(header[len("Bearer ") :].strip())
+        if claims is None:
+            return None
+        return TokenUser(claims)
+
+
+class LoginThrottle:
+    """Refuses password checks after repeated failures for a username and address.
+
+    Failures are also counted per address alone, so one password tried across
+    many usernames is throttled too. The counters live in the shared cache
+    backend when CACHE_BACKEND=redis, so every worker sees the same limits,
+    and in this process otherwise.
+    """
+
+    def __init__(self, app=None) -> None:
+        self._failures = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.max_attempts = int(app.config.get("LOGIN_MAX_ATTEMPTS") or 5)
+        self.max_address_attempts = int(
+            app.config.get("LOGIN_MAX_ATTEMPTS_PER_ADDRESS") or 20
+        )
+        self.window = float(app.config.get("LOGIN_THROTTLE_WINDOW") or 300)
+        app.extensions["login_throttle"] = self
+
+    def retry_after(self, username: str, address: str) -> int:
+        # seconds until another attempt is allowed, 0 when it is allowed now
+        retry = 0
+        for key, limit in self._limits(username, address):
+            failures, remaining = self._read(key)
+            if failures >= limit and remaining > 0:
+                retry = max(retry, int(remaining) + 1)
+        return retry
+
+    def failed(self, username: str, address: str) -> None:
+        for key, limit in self._limits(username, address):
+            if self._increment(key) == limit:
+                logger.warning("throttling logins for %s", key)
+
+    def succeeded(self, username: str, address: str) -> None:
+        # the address counter is kept, a valid login must not reset it for
+        # guesses at other usernames
+        key, _ = self._limits(username, address)[0]
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.reset_counter(key)
+                return
+            except Exception:
+                logger.exception("login throttle reset failed")
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def _limits(self, username: str, address: str) -> list:
+        return [
+            (f"login:{(username or '').lower()}:{address}", self.max_attempts),
+            (f"login-address:{address}", self.max_address_attempts),
+        ]
+
+    def _read(self, key: str) -> tuple:
+        # (failures, seconds left in the window)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return shared.read_counter(key)
+            except Exception:
+                logger.exception("login throttle lookup failed")
+        with self._lock:
+            failures, first = self._failures.get(key, (0, 0))
+        return failures, first + self.window - time.monotonic()
+
+    def _increment(self, key: str) -> int:
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return shared.incr_counter(key, self.window)
+            except Exception:
+                logger.exception("login throttle update failed")
+        now = time.monotonic()
+        with self._lock:
+            failures, first = self._failures.get(key, (0, now))
+            if first + self.window < now:
+                failures, first = 0, now
+            self._failures[key] = (failures + 1, first)
+            if len(self._failures) > 10000:
+                self._prune(now)
+        return failures + 1
+
+    def _prune(self, now: float) -> None:
+        for key, (_, first) in list(self._failures.items()):
+            if first + self.window < now:
+                del self._failures[key]
+
+    @staticmethod
+    def _shared():
+        # the cache backend when it is shared between workers, read per call
+        # because the cache is set up after the throttle
+        from app.cache import RedisBackend
+
+        cache = current_app.extensions.get("cache")
+        backend = cache.backend if cache is not None else None
+        return backend if isinstance(backend, RedisBackend) else None
@@ -0,0 +1,174 @@
+import csv, io, json
+from datetime import datetime
+from sqlalchemy import select
+from app import db, cache
+from app.utils import render_markdown
+
+# export format -> mimetype
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+NOTE_FIELDS = ("id", "title", "content", "private", "date_posted", "username")
+FILE_FIELDS = (
+    "id",
+    "file_name",
+    "file_type",
+    "file_size_bytes",
+    "content_hash",
+    "private",
+    "details",
+    "date_posted",
+    "download_count",
+    "username",
+)
+
+# invalid lines past this are counted but not described
+_max_errors = 100
+
+
+def _note_row(record, user_id) -> dict:
+    # the same fields /api/note/add takes, date_posted keeps the original date
+    if not isinstance(record, dict):
+        raise ValueError("expected a JSON object")
+    title = record.get("title")
+    content = record.get("content")
+    private = record.get("private", True)
+    if not isinstance(title, str) or not isinstance(content, str):
+        raise ValueError("title and content must be strings")
+    if len(title) > 100:
+        raise ValueError("title is longer than 100 characters")
+    if not isinstance(private, bool):
+        raise ValueError("private must be true or false")
+    date_posted = record.get("date_posted")
+    if date_posted is None:
+        date_posted = datetime.utcnow()
+    elif isinstance(date_posted, str):
+        date_posted = datetime.fromisoformat(date_posted)
+    else:
+        raise ValueError("date_posted must be an ISO 8601 date")
+    return {
+        "title": title,
+        "content": content,
+        "content_html": render_markdown(content),
+        "date_posted": date_posted,
+        "user_id": user_id,
+        "private": private,
+    }
+
+
+def _insert(table, rows: list) -> None:
+    # one executemany per batch instead of a flush per note
+    db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def import_notes(lines, user_id, batch_size: int = 1000) -> dict:
+    """Insert notes from NDJSON lines (str or bytes), one JSON object per line.
+
+    Rows are committed every batch_size notes, so memory stays flat however
+    long the input is. Invalid lines are skipped and reported by line number.
+    """
+    from app.models import Note
+
+    result = {"imported": 0, "failed": 0, "errors": []}
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+            batch.append(_note_row(json.loads(line), user_id))
+        except ValueError as error:
+            result["failed"] += 1
+            if len(result["errors"]) < _max_errors:
+                result["errors"].append({"line": number, "error": str(error)})
+            continue
+        if len(batch) >= batch_size:
+            _insert(Note.__table__, batch)
+            result["imported"] += len(batch)
+            batch = []
+    if batch:
+        _insert(Note.__table__, batch)
+        result["imported"] += len(batch)
+    if result["imported"]:
+        cache.invalidate("notes")
+    return result
+
+
+def export_notes(fmt: str = "ndjson", user_id: int = None, batch_size: int = 1000):
+    """Stream notes as NDJSON or CSV, every note or only those of user_id."""
+    from app.models import Note, User
+
+    statement = (
+        select(
+            Note.id,
+            Note.title,
+            Note.content,
+            Note.private,
+            Note.date_posted,
+            User.username,
+        )
+        .outerjoin(User, Note.user_id == User.id)
+        .order_by(Note.id)
+    )
+    if user_id is not None:
+        statement = statement.where(Note.user_id == user_id)
+    return _export(statement, NOTE_FIELDS, fmt, batch_size)
+
+
+def export_files(fmt: str = "ndjson", user_id: int = None, batch_size: int = 1000):
+    """Stream the metadata of files that are not deleted as NDJSON or CSV."""
+    from app.models import File, User
+
+    statement = (
+        select(
+            File.id,
+            File.file_name,
+            File.file_type,
+            File.file_size,
+            File.content_hash,
+            File.private,
+            File.details,
+            File.date_posted,
+            File.download_count,
+            User.username,
+        )
+        .outerjoin(User, File.user_id == User.id)
+        .where(File.deleted.is_(False))
+        .order_by(File.id)
+    )
+    if user_id is not None:
+        statement = statement.where(File.user_id == user_id)
+    return _export(statement, FILE_FIELDS, fmt, batch_size)
+
+
+def _export(statement, fields, fmt: str, batch_size: int):
+    # checked before the generator starts so callers can answer with a 400
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt}")
+    return _stream(statement, fields, fmt, batch_size)
+
+
+def _stream(statement, fields, fmt: str, batch_size: int):
+    # yield_per fetches batch_size rows at a time, through a server side
+    # cursor on postgres, and one chunk is written per batch
+    rows = db.session.execute(statement.execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(fields)
+    for partition in rows.partitions():
+        for row in partition:
+            values = [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            if fmt == "csv":
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values))) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
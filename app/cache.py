@@ -0,0 +1,207 @@
+import logging, threading, time
+from collections import OrderedDict
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """In process LRU with a time to live, each worker process has its own copy.
+
+    Only for a single worker process, see Cache.check_workers.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace: str) -> None:
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Shared between worker processes through a Redis compatible server."""
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package installed")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        return self._client.get(f"cache:{key}")
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(f"cache:{key}", value, px=int(ttl * 1000))
+
+    def generation(self, namespace: str) -> int:
+        return int(self._client.get(f"cache-generation:{namespace}") or 0)
+
+    def bump(self, namespace: str) -> None:
+        self._client.incr(f"cache-generation:{namespace}")
+
+    def incr_counter(self, key: str, ttl: float) -> int:
+        # the first increment of a window creates the counter with its expiry
+        pipe = self._client.pipeline()
+        pipe.set(f"counter:{key}", 0, nx=True, px=int(ttl * 1000))
+        pipe.incr(f"counter:{key}")
+        return pipe.execute()[1]
+
+    def read_counter(self, key: str) -> tuple:
+        # (count, seconds until the counter expires)
+        pipe = self._client.pipeline()
+        pipe.get(f"counter:{key}")
+        pipe.pttl(f"counter:{key}")
+        count, remaining = pipe.execute()
+        return int(count or 0), max(remaining, 0) / 1000
+
+    def reset_counter(self, key: str) -> None:
+        self._client.delete(f"counter:{key}")
+
+
+class Cache:
+    """Read cache for serialized listing pages.
+
+    Entries are keyed by namespace ("notes", "files") and a generation counter.
+    Saving or deleting a note or file bumps the generation of its namespace,
+    so every cached page of it is skipped and ages out of the backend. Set
+    CACHE_BACKEND to "memory" (default, one worker process only), "redis" or
+    "none".
+    """
+
+    def __init__(self, app=None) -> None:
+        self.backend = None
+        self._hits = {}
+        self._misses = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        kind = app.config.get("CACHE_BACKEND") or "memory"
+        self.ttl = float(app.config.get("CACHE_TTL") or 10)
+        if kind == "memory":
+            self.backend = MemoryBackend(
+                int(app.config.get("CACHE_MAX_ENTRIES") or 1024)
+            )
+        elif kind == "redis":
+            self.backend = RedisBackend(app.config.get("CACHE_REDIS_URL"))
+        elif kind == "none":
+            self.backend = None
+        else:
+            raise RuntimeError(f"Unknown CACHE_BACKEND {kind}")
+        app.extensions["cache"] = self
+        metrics = app.extensions.get("metrics")
+        if metrics is not None:
+            metrics.add_collector(app, self._collect)
+
+    def check_workers(self, workers: int) -> None:
+        """Turn the memory backend off when several worker processes serve.
+
+        Each process has its own entries and generations, so a write handled
+        by one worker would not invalidate the pages cached by the others.
+        """
+        if isinstance(self.backend, MemoryBackend) and workers > 1:
+            logger.warning(
+                "CACHE_BACKEND=memory is per process, the listing cache is off "
+                "with %d workers, set CACHE_BACKEND=redis to share it",
+                workers,
+            )
+            self.backend = None
+
+    def cached_json(self, namespace: str, key: str, produce) -> Response:
+        """Serve a JSON response from the cache, calling produce() on a miss."""
+        return self.cached_response(namespace, key, produce)
+
+    def cached_response(
+        self,
+        namespace: str,
+        key: str,
+        produce,
+        mimetype: str = "application/json",
+        depends_on: tuple = (),
+    ) -> Response:
+        """Serve any response from the cache, writes to depends_on invalidate it too."""
+        if self.backend is None:
+            return produce()
+        try:
+            full_key = "".join(
+                f"{name}:{self.backend.generation(name)}:"
+                for name in (namespace, *depends_on)
+            )
+            full_key += key
+            body = self.backend.get(full_key)
+        except Exception:
+            # a cache outage must not take the listings down with it
+            logger.exception("cache lookup failed")
+            return produce()
+        if body is not None:
+            self._count(self._hits, namespace)
+            return Response(body, mimetype=mimetype)
+        self._count(self._misses, namespace)
+        response = produce()
+        if response.status_code == 200:
+            try:
+                self.backend.set(full_key, response.get_data(), self.ttl)
+            except Exception:
+                logger.exception("cache store failed")
+        return response
+
+    def invalidate(self, namespace: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump(namespace)
+        except Exception:
+            logger.exception("cache invalidation failed for %s", namespace)
+
+    def stats(self) -> tuple:
+        """(hits, misses) over every namespace since the process started."""
+        with self._lock:
+            return sum(self._hits.values()), sum(self._misses.values())
+
+    def _count(self, counters: dict, namespace: str) -> None:
+        with self._lock:
+            counters[namespace] = counters.get(namespace, 0) + 1
+
+    def _collect(self) -> list:
+        lines = []
+        for name, counters, help_text in (
+            ("cache_hits_total", self._hits, "Listing pages served from the cache."),
+            ("cache_misses_total", self._misses, "Listing pages built from SQL."),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            with self._lock:
+                for namespace, count in sorted(counters.items()):
+                    lines.append(f'{name}{{namespace="{namespace}"}} {count}')
+        return lines
@@ -0,0 +1,211 @@
+import click
+from flask.cli import AppGroup, with_appcontext
+
+files_cli = AppGroup("files", help="Manage uploaded files.")
+
+
+def init_db() -> None:
+    """Upgrade the database to the latest migration, safe to run again.
+
+    Databases created before the migrations existed are adopted by the first one.
+    """
+    from flask_migrate import upgrade
+
+    upgrade()
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command() -> None:
+    """Create or upgrade the database tables and indexes, same as `flask db upgrade`."""
+    init_db()
+    click.echo("database initialized")
+
+
+def _user_id(username: str):
+    # --user options take a username, no username means every user or anonymous
+    from app.models import User
+
+    if not username:
+        return None
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f"no user named {username}", param_hint="--user")
+    return user.id
+
+
+@files_cli.command("reconcile")
+@click.option("--batch-size", default=500, show_default=True)
+def reconcile_files(batch_size: int) -> None:
+    """Diff the uploads folder against the database and fill in missing metadata."""
+    from app.models import File
+
+    result = File.reconcile_uploads_dir(batch_size=batch_size)
+    click.echo(f"updated metadata for {result['updated']} file(s)")
+    for file_name in result["missing"]:
+        click.echo(f"missing on disk: {file_name}")
+    for file_name in result["untracked"]:
+        click.echo(f"not in database: {file_name}")
+
+
+@files_cli.command("migrate-sizes")
+@click.option("--batch-size", default=500, show_default=True)
+def migrate_file_sizes(batch_size: int) -> None:
+    """Backfill the byte count of files from disk, run `flask db upgrade` first."""
+    from app.models import File
+
+    updated = File.backfill_file_sizes(batch_size=batch_size)
+    click.echo(f"backfilled size for {updated} file(s)")
+
+
+@files_cli.command("purge-uploads")
+@click.option("--hours", default=24, show_default=True)
+def purge_uploads(hours: int) -> None:
+    """Remove chunked upload sessions that were never finalized."""
+    import os
+    from datetime import timedelta
+    from flask import current_app
+    from app import db
+    from app.models import UploadSession
+
+    stale = UploadSession.get_stale(timedelta(hours=hours))
+    for upload in stale:
+        part = os.path.join(
+            current_app.config["UPLOAD_FOLDER"], ".incoming", f"{upload.id}.part"
+        )
+        if os.path.exists(part):
+            os.remove(part)
+        db.session.delete(upload)
+    db.session.commit()
+    click.echo(f"purged {len(stale)} upload session(s)")
+
+
+@files_cli.command("migrate-blobs")
+@click.option("--batch-size", default=100, show_default=True)
+def migrate_blobs(batch_size: int) -> None:
+    """Move files stored by name in the uploads folder into the blob store."""
+    from app.models import File
+
+    moved = File.move_to_blob_store(batch_size=batch_size)
+    click.echo(f"moved {moved} file(s) into the blob store")
+
+
+@files_cli.command("rebuild-download-stats")
+def rebuild_download_stats() -> None:
+    """Recompute download counters and hourly rollups from the download table."""
+    from sqlalchemy import func
+    from app import db
+    from app.models import Download, DownloadRollup, File
+
+    rows = (
+        db.session.query(Download.file_id, Download.download_date)
+        .order_by(Download.file_id)
+        .yield_per(10000)
+    )
+    db.session.query(DownloadRollup).delete()
+    db.session.query(File).update(
+        {File.download_count: 0, File.last_downloaded: None},
+        synchronize_session=False,
+    )
+    batch = []
+    for file_id, download_date in rows:
+        batch.append({"file_id": file_id, "download_date": download_date})
+        if len(batch) == 10000:
+            Download.after_audit_flush(batch)
+            batch = []
+    Download.after_audit_flush(batch)
+    db.session.commit()
+    total = db.session.query(func.sum(DownloadRollup.count)).scalar() or 0
+    click.echo(f"rebuilt download stats from {total} download(s)")
+
+
+@files_cli.command("export")
+@click.argument("output", type=click.File("w"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option("--user", "username", help="Only the files of this user.")
+@click.option("--batch-size", default=1000, show_default=True)
+def export_files(output, fmt: str, username: str, batch_size: int) -> None:
+    """Write the metadata of every file that is not deleted to OUTPUT."""
+    from app.bulk import export_files as stream_files
+
+    for chunk in stream_files(fmt, _user_id(username), batch_size=batch_size):
+        output.write(chunk)
+
+
+notes_cli = AppGroup("notes", help="Manage notes.")
+
+
+@notes_cli.command("import")
+@click.argument("source", type=click.File("rb"), default="-")
+@click.option("--user", "username", help="Owner of the notes, anonymous by default.")
+@click.option("--batch-size", default=1000, show_default=True)
+def import_notes(source, username: str, batch_size: int) -> None:
+    """Import notes from SOURCE, one JSON object per line."""
+    from app.bulk import import_notes as insert_notes
+
+    result = insert_notes(source, _user_id(username), batch_size=batch_size)
+    click.echo(f"imported {result['imported']} note(s)")
+    for error in result["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    if result["failed"]:
+        raise click.ClickException(f"skipped {result['failed']} invalid line(s)")
+
+
+@notes_cli.command("export")
+@click.argument("output", type=click.File("w"), default="-")
+@click.option("--format", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson")
+@click.option("--user", "username", help="Only the notes of this user.")
+@click.option("--batch-size", default=1000, show_default=True)
+def export_notes(output, fmt: str, username: str, batch_size: int) -> None:
+    """Write every note to OUTPUT, `flask notes import` reads the NDJSON back."""
+    from app.bulk import export_notes as stream_notes
+
+    for chunk in stream_notes(fmt, _user_id(username), batch_size=batch_size):
+        output.write(chunk)
+
+
+@notes_cli.command("render-markdown")
+@click.option("--all", "render_all", is_flag=True, help="Re-render every note.")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--workers", type=int, default=None, help="Defaults to the CPU count.")
+def render_markdown(render_all: bool, batch_size: int, workers: int) -> None:
+    """Store the rendered HTML of notes saved before it was cached."""
+    from app.models import Note
+
+    rendered = Note.backfill_content_html(
+        render_all=render_all, batch_size=batch_size, workers=workers
+    )
+    click.echo(f"rendered {rendered} note(s)")
+
+
+@click.command("serve")
+@click.option("--host", help="Defaults to WEB_HOST.")
+@click.option("--port", type=int, help="Defaults to WEB_PORT.")
+@click.option(
+    "--workers", type=int, help="Defaults to WEB_CONCURRENCY or 2 * CPUs + 1."
+)
+@click.option("--threads", type=int, help="Threads per gthread worker.")
+@click.option(
+    "--worker-class",
+    type=click.Choice(["gthread", "gevent", "sync"]),
+    help="gevent needs the gevent package installed.",
+)
+@click.option("--preload/--no-preload", default=None, help="Share the app via fork.")
+@click.option("--keepalive", type=int, help="Seconds to hold idle connections.")
+@with_appcontext
+def serve(host, port, workers, threads, worker_class, preload, keepalive) -> None:
+    """Run the app with gunicorn, the production server."""
+    from flask import current_app
+    from app.server import Server, server_options
+
+    config = current_app.config
+    options = server_options(
+        config,
+        bind=f"{host or config['WEB_HOST']}:{port or config['WEB_PORT']}",
+        workers=workers,
+        threads=threads,
+        worker_class=worker_class,
+        preload_app=preload,
+        keepalive=keepalive,
+    )
+    Server(current_app._get_current_object(), options).run()
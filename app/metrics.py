@@ -0,0 +1,218 @@
+import logging, threading, time
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_query_buckets = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class _Histogram:
+    def __init__(self, buckets) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Metrics:
+    """Per request cost accounting, served at /metrics in the Prometheus text format.
+
+    Latency, query count, time spent in the database, rows and response bytes
+    are recorded per endpoint, the bytes of a streamed body once it was sent. With QUERY_BUDGET set, a request that runs more
+    queries is logged, or fails when QUERY_BUDGET_MODE is "raise".
+    """
+
+    def __init__(self, app=None) -> None:
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._queries = {}
+        self._totals = {}
+        self._requests = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.query_budget = int(app.config.get("QUERY_BUDGET") or 0)
+        self.query_budget_mode = app.config.get("QUERY_BUDGET_MODE") or "log"
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self.render)
+        app.extensions["metrics"] = self
+        app.extensions["metrics_collectors"] = []
+        if event.contains(Engine, "before_cursor_execute", self._before_cursor_execute):
+            return
+
+        from app import db
+
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(db.Model, "load", self._on_load, propagate=True)
+
+    def add_collector(self, app, collector) -> None:
+        # collectors return extra exposition lines, e.g. cache or pool statistics.
+        # they are kept per app, so another create_app() does not repeat them
+        app.extensions["metrics_collectors"].append(collector)
+
+    def _before_request(self) -> None:
+        g._request_metrics = {
+            "start": time.perf_counter(),
+            "queries": 0,
+            "db_time": 0.0,
+            "rows": 0,
+            "over_budget": False,
+        }
+
+    def _after_request(self, response: Response) -> Response:
+        stats = g.pop("_request_metrics", None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats["start"]
+        endpoint = request.endpoint or "unknown"
+        sent = response.content_length
+        if sent is None and response.is_streamed:
+            # the length of a streamed body is only known once the server has
+            # sent it, its bytes are added when the response is closed
+            response.response = _CountedBody(response.response, self, endpoint)
+        sent = sent or 0
+        with self._lock:
+            key = (endpoint, request.method, str(response.status_code))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._latency.setdefault(endpoint, _Histogram(_latency_buckets)).observe(
+                elapsed
+            )
+            self._queries.setdefault(endpoint, _Histogram(_query_buckets)).observe(
+                stats["queries"]
+            )
+            totals = self._totals.setdefault(
+                endpoint, {"db_time": 0.0, "rows": 0, "bytes": 0}
+            )
+            totals["db_time"] += stats["db_time"]
+            totals["rows"] += stats["rows"]
+            totals["bytes"] += sent
+        return response
+
+    def add_bytes(self, endpoint: str, sent: int) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(
+                endpoint, {"db_time": 0.0, "rows": 0, "bytes": 0}
+            )
+            totals["bytes"] += sent
+
+    @staticmethod
+    def current() -> dict:
+        # the stats of the request being handled, None outside a request
+        return g.get("_request_metrics") if g else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, *args) -> None:
+        stats = self.current()
+        if stats is None:
+            return
+        stats["queries"] += 1
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+        if self.query_budget and stats["queries"] > self.query_budget:
+            if self.query_budget_mode == "raise":
+                raise QueryBudgetExceeded(
+                    f"{request.endpoint} ran more than {self.query_budget} queries"
+                )
+            if not stats["over_budget"]:
+                stats["over_budget"] = True
+                logger.warning(
+                    "%s %s exceeded the query budget of %s",
+                    request.method,
+                    request.path,
+                    self.query_budget,
+                )
+
+    def _after_cursor_execute(self, conn, cursor, statement, *args) -> None:
+        stats = self.current()
+        if stats is None or not conn.info.get("query_start"):
+            return
+        stats["db_time"] += time.perf_counter() - conn.info["query_start"].pop()
+        if cursor.rowcount and cursor.rowcount > 0:
+            stats["rows"] += cursor.rowcount
+
+    def _on_load(self, target, context) -> None:
+        stats = self.current()
+        if stats is not None:
+            stats["rows"] += 1
+
+    def render(self) -> Response:
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP http_requests_total Requests handled.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(
+                    f'http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+            lines += _histogram_lines(
+                "http_request_duration_seconds", "Request latency.", self._latency
+            )
+            lines += _histogram_lines(
+                "db_queries_per_request", "Queries run per request.", self._queries
+            )
+            for name, field, help_text in (
+                ("db_query_duration_seconds_total", "db_time", "Time spent in SQL."),
+                ("db_rows_total", "rows", "Rows loaded or written."),
+                ("http_response_bytes_total", "bytes", "Response body bytes sent."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for endpoint, totals in sorted(self._totals.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {totals[field]}')
+        for collector in current_app.extensions["metrics_collectors"]:
+            lines += collector()
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+class _CountedBody:
+    """A streamed response body that reports the bytes it yielded when closed."""
+
+    def __init__(self, body, metrics: Metrics, endpoint: str) -> None:
+        self._body = body
+        self._metrics = metrics
+        self._endpoint = endpoint
+        self._sent = 0
+        self._closed = False
+
+    def __iter__(self):
+        for chunk in self._body:
+            self._sent += len(chunk if isinstance(chunk, bytes) else chunk.encode())
+            yield chunk
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if hasattr(self._body, "close"):
+            self._body.close()
+        self._metrics.add_bytes(self._endpoint, self._sent)
+
+
+def _histogram_lines(name: str, help_text: str, histograms: dict) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for endpoint, histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+        lines.append(
+            f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.total}'
+        )
+        lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.total}')
+    return lines
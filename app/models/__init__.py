@@ -2,7 +2,11 @@ from .user import User as User
 from .note import Note as Note
 from .file import File as File
 from .download import Download as Download
+from .download_rollup import DownloadRollup as DownloadRollup
 from .upload import Upload as Upload
 from .bookmark import Bookmark as Bookmark
 from .group import Group as Group
 from .deletion import Deletion as Deletion
+from .upload_session import UploadSession as UploadSession
+from .blob import Blob as Blob
+from .revoked_token import RevokedToken as RevokedToken
@@ -0,0 +1,46 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+
+class Blob(db.Model):
+    sha256: str = db.Column(db.String(64), primary_key=True)
+    size: int = db.Column(db.BigInteger, nullable=False)
+    refcount: int = db.Column(db.Integer, nullable=False, default=0)
+    created: datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, sha256: str, size: int, refcount: int = 1) -> None:
+        self.sha256 = sha256
+        self.size = size
+        self.refcount = refcount
+
+    def __repr__(self) -> str:
+        return f"Blob('{self.sha256}', '{self.size}', '{self.refcount}')"
+
+    @staticmethod
+    def acquire(sha256: str, size: int) -> None:
+        # the caller commits, the increment happens in the database so it cannot race
+        updated = Blob.query.filter_by(sha256=sha256).update(
+            {"refcount": Blob.refcount + 1}, synchronize_session=False
+        )
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(sha256, size))
+        except IntegrityError:
+            Blob.query.filter_by(sha256=sha256).update(
+                {"refcount": Blob.refcount + 1}, synchronize_session=False
+            )
+
+    @staticmethod
+    def release(sha256: str) -> bool:
+        # returns True when the last reference is gone. unlink the blob before the
+        # commit, while the row is locked, or a concurrent acquire may count on it
+        Blob.query.filter_by(sha256=sha256).update(
+            {"refcount": Blob.refcount - 1}, synchronize_session=False
+        )
+        deleted = Blob.query.filter(Blob.sha256 == sha256, Blob.refcount <= 0).delete(
+            synchronize_session=False
+        )
+        return deleted == 1
@@ -1,4 +1,4 @@
-from app import db
+from app import db, audit_log
 from datetime import datetime
 from app.models.user import User
 
@@ -21,7 +21,7 @@ class Deletion(db.Model):
 
     def __init__(self, file_id: int, user_id: int, reason: str = None) -> None:
         user = User.get_user(user_id)
-        if user.is_admin == False:
+        if not user.is_admin():
             raise Exception("User is not an admin")
         self.deletion_date = datetime.utcnow()
         self.deleted_by = user_id
@@ -34,3 +34,14 @@ class Deletion(db.Model):
     def save(self) -> None:
         db.session.add(self)
         db.session.commit()
+
+    @classmethod
+    def record_deletion(cls, file_id: int, user_id: int, reason: str = None) -> None:
+        # callers check that the user is an admin before deleting the file
+        audit_log.record(
+            cls,
+            deletion_date=datetime.utcnow(),
+            deleted_by=user_id,
+            file_deleted=file_id,
+            reason_deleted=reason,
+        )
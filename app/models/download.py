@@ -1,5 +1,5 @@
 from datetime import datetime
-from app import db
+from app import db, audit_log
 
 
 class Download(db.Model):
@@ -14,7 +14,10 @@ class Download(db.Model):
         default=None,
     )
     file_id = db.Column(
-        db.Integer, db.ForeignKey("file.id", ondelete="NO ACTION"), nullable=False
+        db.Integer,
+        db.ForeignKey("file.id", ondelete="NO ACTION"),
+        nullable=False,
+        index=True,
     )
 
     def __init__(
@@ -34,12 +37,28 @@ class Download(db.Model):
         db.session.add(self)
         db.session.commit()
 
+    @staticmethod
+    def after_audit_flush(rows) -> None:
+        # keep File counters and the hourly rollup in step with each inserted batch
+        from app.models.file import File
+        from app.models.download_rollup import DownloadRollup
+
+        per_file, per_bucket = {}, {}
+        for row in rows:
+            file_id, moment = row["file_id"], row["download_date"]
+            downloads, latest = per_file.get(file_id, (0, moment))
+            per_file[file_id] = (downloads + 1, max(latest, moment))
+            bucket = (file_id, DownloadRollup.bucket_for(moment))
+            per_bucket[bucket] = per_bucket.get(bucket, 0) + 1
+        File.add_download_counts(per_file)
+        DownloadRollup.add_counts(per_bucket)
+
     @classmethod
     def record_download(cls, file_id, user_id=None):
-        download = cls(
-            file_id=file_id,
-            user_id=user_id,
+        # queued, the audit log inserts downloads in batches off the request thread
+        audit_log.record(
+            cls,
             download_date=datetime.utcnow(),
+            user_id=user_id,
+            file_id=file_id,
         )
-        db.session.add(download)
-        db.session.commit()
@@ -0,0 +1,58 @@
+from datetime import datetime
+from app import db
+
+
+class DownloadRollup(db.Model):
+    __table_args__ = (db.Index("ix_download_rollup_bucket", "bucket", "file_id"),)
+
+    file_id = db.Column(
+        db.Integer,
+        db.ForeignKey("file.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # start of the hour the downloads happened in
+    bucket: datetime = db.Column(db.DateTime, primary_key=True)
+    count: int = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"DownloadRollup('{self.file_id}', '{self.bucket}', '{self.count}')"
+
+    @staticmethod
+    def bucket_for(moment: datetime) -> datetime:
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def add_counts(counts: dict) -> None:
+        # counts maps (file_id, bucket) -> downloads, merged with one upsert
+        table = DownloadRollup.__table__
+        rows = [
+            {"file_id": file_id, "bucket": bucket, "count": count}
+            for (file_id, bucket), count in counts.items()
+        ]
+        if not rows:
+            return
+        dialect = db.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            insert = None
+        if insert is not None:
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.file_id, table.c.bucket],
+                set_={"count": table.c.count + statement.excluded["count"]},
+            )
+            db.session.execute(statement, rows)
+            return
+        for row in rows:
+            updated = db.session.execute(
+                table.update()
+                .where(
+                    table.c.file_id == row["file_id"], table.c.bucket == row["bucket"]
+                )
+                .values(count=table.c.count + row["count"])
+            ).rowcount
+            if not updated:
+                db.session.execute(table.insert().values(**row))
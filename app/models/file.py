@@ -1,24 +1,56 @@
-from app import db
+from flask import current_app
+from app import db, blob_store, cache
 from typing import List, Generator
-from datetime import datetime
-from sqlalchemy import or_
-import os
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, func, case, bindparam, false
+from sqlalchemy.orm import selectinload
+from app.utils import keyset_filter, human_readable_size
+import logging, os
 
-_upload_folder = os.environ.get("UPLOAD_FOLDER")
+logger = logging.getLogger(__name__)
 
 
 class File(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_file_deleted_private_date_posted", "deleted", "private", "date_posted"
+        ),
+        # a user's files, newest first
+        db.Index(
+            "ix_file_user_id_deleted_date_posted",
+            "user_id",
+            "deleted",
+            "date_posted",
+            "id",
+        ),
+    )
+
     id: int = db.Column(db.Integer, primary_key=True)
     date_posted: datetime = db.Column(
         db.DateTime, nullable=False, default=datetime.utcnow
     )
     last_downloaded: datetime = db.Column(db.DateTime, nullable=True, default=None)
+    download_count: int = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
     user_id: int = db.Column(
         db.Integer, db.ForeignKey("user.id"), nullable=True, default=None
     )
-    file_name: str = db.Column(db.String(100), nullable=True, default=None)
-    file_size: str = db.Column(db.String, nullable=True, default=None)
+    # looked up on every upload to refuse duplicate names
+    file_name: str = db.Column(db.String(100), nullable=True, default=None, index=True)
+    # size in bytes, the column name differs from the legacy pre-formatted string column
+    file_size: int = db.Column(
+        "file_size_bytes", db.BigInteger, nullable=True, default=None, index=True
+    )
     file_type: str = db.Column(db.String(100), nullable=True, default=None)
+    # files uploaded before the blob store have no hash and live in the uploads folder
+    content_hash: str = db.Column(
+        db.String(64),
+        db.ForeignKey("blob.sha256", ondelete="NO ACTION"),
+        nullable=True,
+        default=None,
+        index=True,
+    )
     deleted: bool = db.Column(db.Boolean, nullable=False, default=False)
     date_deleted: datetime = db.Column(db.DateTime, nullable=True, default=None)
     private: bool = db.Column(db.Boolean, nullable=False, default=False)
@@ -53,91 +85,336 @@ class File(db.Model):
     def save(self) -> int:
         db.session.add(self)
         db.session.commit()
+        cache.invalidate("files")
+
+    @property
+    def storage_name(self) -> str:
+        # path of the stored bytes relative to the uploads folder
+        if self.content_hash is None:
+            return self.file_name
+        return os.path.join("blobs", blob_store.relative_path(self.content_hash))
+
+    def set_blob(self, content_hash: str, size: int):
+        # returns the hash of a blob that lost its last reference. the blob row stays
+        # locked until commit, place the new blob and unlink the old one before that
+        from app.models.blob import Blob
+
+        if self.content_hash == content_hash:
+            return None
+        released = self.content_hash
+        Blob.acquire(content_hash, size)
+        self.content_hash = content_hash
+        self.file_size = size
+        if released is not None and Blob.release(released):
+            return released
+        return None
 
     def delete(self):
-        try:
-            os.remove(os.path.join(_upload_folder, self.file_name))
-        except FileNotFoundError:
-            print("File not found")
-        self.deleted = True
+        from app.models.blob import Blob
+
+        # a second delete must not release the blob again, it may be shared
+        if self.deleted:
+            return
+        marked = File.query.filter_by(id=self.id, deleted=False).update(
+            {File.deleted: True, File.date_deleted: datetime.utcnow()},
+            synchronize_session="fetch",
+        )
+        if not marked:
+            db.session.rollback()
+            return
+        if self.content_hash is None:
+            try:
+                os.remove(
+                    os.path.join(current_app.config["UPLOAD_FOLDER"], self.file_name)
+                )
+            except FileNotFoundError:
+                logger.warning("File not found: %s", self.file_name)
+        elif Blob.release(self.content_hash):
+            # unlinked while the blob row is locked, an upload of the same content
+            # waits for this commit and then writes the blob again
+            blob_store.remove(self.content_hash)
         db.session.commit()
+        cache.invalidate("files")
 
-    def is_editable(self, user_id: int = None) -> bool:
-        if user_id is None:
+    def is_editable(self, user=None) -> bool:
+        # takes the user object (usually current_user) so no lookup is needed
+        if user is None or not user.is_authenticated:
             return False
-        from app.models.user import User
-
-        return (
-            self.is_owned_by_user(user_id)
-            or User.query.filter_by(id=user_id).first().is_admin()
-        )
+        return self.is_owned_by_user(user.id) or user.is_admin()
 
     def can_be_viewed(self, user_id) -> bool:
         if user_id is None:
             return not self.private or self.is_anonymous()
         return self.is_owned_by_user(user_id) or not self.private
 
+    @staticmethod
+    def viewable_by(user_id):
+        # SQL version of can_be_viewed, soft deleted files are never listed
+        if user_id is None:
+            visible = or_(File.private.is_(False), File.user_id.is_(None))
+        else:
+            visible = or_(File.user_id == user_id, File.private.is_(False))
+        return and_(File.deleted.is_(False), visible)
+
     def get_owner(self):
-        from app.models.user import User
+        return self.author
 
-        owner = User.query.filter_by(id=self.user_id).first()
-        return owner
+    @staticmethod
+    def get_all_user_files(user_id, limit: int = 0, cursor=None) -> List:
+        return File.user_files_query(user_id, limit, cursor).all()
+
+    @staticmethod
+    def user_files_query(user_id, limit: int = 0, cursor=None):
+        query = File.query.filter(File.user_id == user_id, File.deleted.is_(False))
+        if cursor is not None:
+            query = query.filter(keyset_filter(File.date_posted, File.id, cursor))
+        query = query.order_by(File.date_posted.desc(), File.id.desc())
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def return_index_page_files(
+        user_id, limit: int = 0, offset: int = 0, cursor=None
+    ) -> List:
+        return File.index_page_query(user_id, limit, offset, cursor).all()
+
+    @staticmethod
+    def index_page_query(user_id, limit: int = 0, offset: int = 0, cursor=None):
+        query = File.query.options(selectinload(File.author)).filter(
+            File.viewable_by(user_id)
+        )
+        if cursor is not None:
+            query = query.filter(keyset_filter(File.date_posted, File.id, cursor))
+        query = query.order_by(File.date_posted.desc(), File.id.desc())
+        if limit:
+            query = query.limit(limit)
+        return query.offset(offset)
+
+    @staticmethod
+    def type_from_name(file_name: str) -> str:
+        return os.path.splitext(file_name)[1].lstrip(".").lower() or None
+
+    def store_upload(self, stream) -> None:
+        # metadata is captured once at ingest time instead of on every listing
+        tmp_path, content_hash, size = blob_store.receive_stream(stream)
+        try:
+            released = self.set_blob(content_hash, size)
+            # placed once the blob row is locked, so a delete of the same content
+            # cannot unlink it between the existence check and the commit
+            blob_store.store_file(tmp_path, content_hash)
+            if released is not None:
+                blob_store.remove(released)
+            self.file_type = File.type_from_name(self.file_name)
+            self.save()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def reconcile_uploads_dir(batch_size: int = 500) -> dict:
+        on_disk = {entry.name: entry.stat().st_size for entry in File.scan_folder()}
+        rows = (
+            db.session.query(
+                File.id,
+                File.file_name,
+                File.file_size,
+                File.file_type,
+                File.content_hash,
+            )
+            .filter(File.deleted.is_(False))
+            .all()
+        )
+        updates, missing, tracked = [], [], set()
+        for file_id, file_name, file_size, file_type, content_hash in rows:
+            # blob backed rows live in the blob store, not under their name
+            if content_hash is not None:
+                if not blob_store.exists(content_hash):
+                    missing.append(file_name)
+                continue
+            if file_name not in on_disk:
+                missing.append(file_name)
+                continue
+            tracked.add(file_name)
+            if file_size is None or file_type is None:
+                updates.append(
+                    {
+                        "id": file_id,
+                        "file_size": on_disk[file_name],
+                        "file_type": File.type_from_name(file_name),
+                    }
+                )
+        for start in range(0, len(updates), batch_size):
+            db.session.bulk_update_mappings(File, updates[start : start + batch_size])
+            db.session.commit()
+        return {
+            "updated": len(updates),
+            "missing": missing,
+            "untracked": sorted(on_disk.keys() - tracked),
+        }
 
     @staticmethod
-    def get_all_user_files(user_id):
-        return [
-            file
-            for file in File.query.filter_by(user_id=user_id).all()
-            if not file.deleted
+    def backfill_file_sizes(batch_size: int = 500) -> int:
+        # used by the size migration, rows written before sizes were stored as bytes
+        on_disk = {entry.name: entry.stat().st_size for entry in File.scan_folder()}
+        rows = (
+            db.session.query(File.id, File.file_name)
+            .filter(File.file_size.is_(None))
+            .all()
+        )
+        updates = [
+            {"id": file_id, "file_size": on_disk[file_name]}
+            for file_id, file_name in rows
+            if file_name in on_disk
         ]
+        for start in range(0, len(updates), batch_size):
+            db.session.bulk_update_mappings(File, updates[start : start + batch_size])
+            db.session.commit()
+        return len(updates)
+
+    @staticmethod
+    def total_bytes_for_user(user_id: int) -> int:
+        return (
+            db.session.query(func.coalesce(func.sum(File.file_size), 0))
+            .filter(File.user_id == user_id, File.deleted.is_(False))
+            .scalar()
+        )
+
+    @staticmethod
+    def total_bytes_by_user() -> List:
+        return (
+            db.session.query(
+                File.user_id,
+                func.count(File.id).label("file_count"),
+                func.coalesce(func.sum(File.file_size), 0).label("total_bytes"),
+            )
+            .filter(File.deleted.is_(False))
+            .group_by(File.user_id)
+            .order_by(func.sum(File.file_size).desc())
+            .all()
+        )
 
     @staticmethod
-    def return_index_page_files(user_id, limit: int = 0, offset: int = 0) -> List:
-        File.read_info_from_uploads_dir()
-        from app.models.user import User
-        if limit == 0:
-            return [
-                file
-                for file in File.query.order_by(File.date_posted.desc()).all()
-                if file.can_be_viewed(user_id) and not file.deleted
-            ]
-        return [
-            file
-            for file in File.query.order_by(File.date_posted.desc()).all()
-            if file.can_be_viewed(user_id) and not file.deleted
-        ][offset : offset + limit]
-
-    @staticmethod
-    def read_info_from_uploads_dir() -> None:
-        for file in File.scan_folder():
-            file_data = File.query.filter_by(file_name=file).first()
-            if file_data is not None:
-                if file_data.file_size is None:
-                    file_size_bytes = os.path.getsize(
-                        os.path.join(_upload_folder, file)
-                    )
-                    file_size_kb = file_size_bytes / 1024
-                    file_size_mb = file_size_kb / 1024
-                    file_size_gb = file_size_mb / 1024
-
-                    if file_size_bytes < 1024:
-                        file_data.file_size = f"{file_size_bytes} B"
-                    elif file_size_kb < 1024:
-                        file_data.file_size = f"{file_size_kb:.2f} KB"
-                    elif file_size_mb < 1024:
-                        file_data.file_size = f"{file_size_mb:.2f} MB"
-                    else:
-                        file_data.file_size = f"{file_size_gb:.2f} GB"
-
-                if file_data.file_type is None:
-                    file_data.file_type = file.split(".")[-1]
+    def total_bytes_by_type() -> List:
+        return (
+            db.session.query(
+                File.file_type,
+                func.count(File.id).label("file_count"),
+                func.coalesce(func.sum(File.file_size), 0).label("total_bytes"),
+            )
+            .filter(File.deleted.is_(False))
+            .group_by(File.file_type)
+            .order_by(func.sum(File.file_size).desc())
+            .all()
+        )
+
+    @staticmethod
+    def largest_files(user_id, limit: int = 10) -> List:
+        return (
+            File.query.options(selectinload(File.author))
+            .filter(File.viewable_by(user_id), File.file_size.isnot(None))
+            .order_by(File.file_size.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def move_to_blob_store(batch_size: int = 100) -> int:
+        # files from before the blob store are hashed and linked into it, the
+        # originals are only removed once the rows pointing at the blobs commit
+        moved = 0
+        rows = File.query.filter(
+            File.content_hash.is_(None), File.deleted.is_(False)
+        ).all()
+        linked = []
+        for file in rows:
+            path = os.path.join(current_app.config["UPLOAD_FOLDER"], file.file_name)
+            if not os.path.isfile(path):
+                continue
+            content_hash = blob_store.hash_file(path)
+            size = os.path.getsize(path)
+            file.set_blob(content_hash, size)
+            blob_store.link_file(path, content_hash)
+            linked.append(path)
+            moved += 1
+            if len(linked) == batch_size:
                 db.session.commit()
+                File._remove_originals(linked)
+                linked = []
+        db.session.commit()
+        File._remove_originals(linked)
+        return moved
 
     @staticmethod
-    def scan_folder() -> Generator[str, None, None]:
-        for file in os.listdir(_upload_folder):
-            print("File: ", file)
-            yield file
+    def _remove_originals(paths: list) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def add_download_counts(counts: dict) -> None:
+        # counts maps file_id -> (downloads, latest download), applied as one executemany
+        if not counts:
+            return
+        table = File.__table__
+        latest = bindparam("latest", type_=db.DateTime)
+        statement = (
+            table.update()
+            .where(table.c.id == bindparam("file_id"))
+            .values(
+                download_count=table.c.download_count + bindparam("downloads"),
+                last_downloaded=case(
+                    (
+                        or_(
+                            table.c.last_downloaded.is_(None),
+                            table.c.last_downloaded < latest,
+                        ),
+                        latest,
+                    ),
+                    else_=table.c.last_downloaded,
+                ),
+            )
+        )
+        db.session.execute(
+            statement,
+            [
+                {"file_id": file_id, "downloads": downloads, "latest": latest}
+                for file_id, (downloads, latest) in counts.items()
+            ],
+        )
+
+    @staticmethod
+    def popular_files(user_id, limit: int = 10, hours: int = 24) -> List:
+        from app.models.download_rollup import DownloadRollup
+
+        since = DownloadRollup.bucket_for(datetime.utcnow() - timedelta(hours=hours))
+        downloads = (
+            db.session.query(
+                DownloadRollup.file_id,
+                func.sum(DownloadRollup.count).label("downloads"),
+            )
+            .filter(DownloadRollup.bucket >= since)
+            .group_by(DownloadRollup.file_id)
+            .subquery()
+        )
+        return (
+            db.session.query(File, downloads.c.downloads)
+            .join(downloads, downloads.c.file_id == File.id)
+            .options(selectinload(File.author))
+            .filter(File.viewable_by(user_id))
+            .order_by(downloads.c.downloads.desc(), File.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def scan_folder() -> Generator[os.DirEntry, None, None]:
+        with os.scandir(current_app.config["UPLOAD_FOLDER"]) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry
 
     @staticmethod
     def get_admin_files(current_user):
@@ -150,32 +427,36 @@ class File(db.Model):
         return file.save()
 
     @staticmethod
-    def search(search_term: str, user_id) -> List:
-        if search_term != "":
-            return [
-                file
-                for file in File.query.filter(
-                    or_(
-                        File.file_name.contains(search_term),
-                        File.details.contains(search_term),
-                    )
-                )
-                if file.can_be_viewed(user_id) and not file.deleted
-            ]
-        return []
+    def search(search_term: str, user_id, limit: int = 0, offset: int = 0) -> List:
+        from app.search import search_terms
 
-    def serialize(self):
-        from app.models.user import User
+        if not search_terms(search_term):
+            return []
+        return File.search_query(search_term, user_id, limit, offset).all()
 
+    @staticmethod
+    def search_query(search_term: str, user_id, limit: int = 0, offset: int = 0):
+        from app.search import apply_search, search_terms
+
+        query = File.query.options(selectinload(File.author))
+        if not search_terms(search_term):
+            return query.filter(false())
+        query = apply_search(query.filter(File.viewable_by(user_id)), File, search_term)
+        query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    def serialize(self):
         return {
             "id": self.id,
             "date_posted": self.date_posted,
             "last_downloaded": self.last_downloaded,
-            "user": User.query.filter_by(id=self.user_id).first().serialize()
-            if self.user_id is not None
-            else "",
+            "download_count": self.download_count,
+            "user": self.author.serialize() if self.author is not None else "",
             "file_name": self.file_name,
-            "file_size": self.file_size,
+            "file_size": human_readable_size(self.file_size),
+            "file_size_bytes": self.file_size,
             "file_type": self.file_type,
             "private": self.private,
             "details": self.details,
@@ -1,13 +1,25 @@
+import os
 from typing import List
 from datetime import datetime
-from sqlalchemy import or_
-from app import db
+from sqlalchemy import or_, bindparam, false
+from sqlalchemy.orm import selectinload, validates
+from app import db, cache
+from app.utils import keyset_filter, render_markdown
 
 
 class Note(db.Model):
+    __table_args__ = (
+        db.Index("ix_note_date_posted_id", "date_posted", "id"),
+        db.Index("ix_note_private_date_posted", "private", "date_posted"),
+        # a user's notes, newest first
+        db.Index("ix_note_user_id_date_posted", "user_id", "date_posted", "id"),
+    )
+
     id: int = db.Column(db.Integer, primary_key=True)
     title: str = db.Column(db.String(100), nullable=True, default=None)
     content: str = db.Column(db.Text, nullable=True, default=None)
+    # rendered once when the content changes instead of on every page view
+    content_html: str = db.Column(db.Text, nullable=True, default=None)
     date_posted: datetime = db.Column(
         db.DateTime, nullable=False, default=datetime.utcnow
     )
@@ -19,6 +31,18 @@ class Note(db.Model):
     )
     private: bool = db.Column(db.Boolean, nullable=False, default=True)
 
+    @validates("content")
+    def _render_content(self, key, content):
+        self.content_html = render_markdown(content)
+        return content
+
+    @property
+    def rendered_html(self) -> str:
+        # rows written before content_html existed are rendered until backfilled
+        if self.content_html is None:
+            return render_markdown(self.content)
+        return self.content_html
+
     def __repr__(self) -> str:
         return f"Note('{self.title}', '{self.date_posted}')"
 
@@ -34,11 +58,13 @@ class Note(db.Model):
     def save(self) -> None:
         db.session.add(self)
         db.session.commit()
+        cache.invalidate("notes")
 
     def delete(self, user_id: int, admin: bool = False) -> bool:
         if self.is_owned_by_user(user_id) or admin:
             db.session.delete(self)
             db.session.commit()
+            cache.invalidate("notes")
             return True
         return False
 
@@ -47,63 +73,121 @@ class Note(db.Model):
             return not self.private or self.is_anonymous()
         return self.is_owned_by_user(user_id) or not self.private
 
-    def get_owner(self) -> str:
-        from app.models.user import User
+    @staticmethod
+    def viewable_by(user_id):
+        # SQL version of is_viewable_by_user
+        if user_id is None:
+            return or_(Note.private.is_(False), Note.user_id.is_(None))
+        return or_(Note.user_id == user_id, Note.private.is_(False))
 
-        owner = User.query.filter_by(id=self.user_id).first()
-        return owner
+    def get_owner(self):
+        return self.author
 
     @staticmethod
     def get_all_anonymous_notes():
         return Note.query.filter_by(user_id=None).all()
 
     @staticmethod
-    def search(search_term: str, user_id) -> List:
-        if search_term != "":
-            return [
-                note
-                for note in Note.query.filter(
-                    or_(
-                        Note.content.contains(search_term),
-                        Note.title.contains(search_term),
-                    )
-                ).all()
-                if note.is_viewable_by_user(user_id)
-            ]
-        return []
+    def search(search_term: str, user_id, limit: int = 0, offset: int = 0) -> List:
+        from app.search import search_terms
+
+        if not search_terms(search_term):
+            return []
+        return Note.search_query(search_term, user_id, limit, offset).all()
 
     @staticmethod
-    def index_page_notes(user_id, limit: int = 0, offset: int = 0) -> List:
-        if limit == 0:
-            return [
-                note
-                for note in Note.query.order_by(Note.date_posted.desc())
-                .offset(offset)
-                .all()
-                if note.is_viewable_by_user(user_id)
-            ]
-        return [
-            note
-            for note in Note.query.order_by(Note.date_posted.desc())
-            .limit(limit)
-            .offset(offset)
-            .all()
-            if note.is_viewable_by_user(user_id)
-        ]
+    def search_query(search_term: str, user_id, limit: int = 0, offset: int = 0):
+        from app.search import apply_search, search_terms
+
+        query = Note.query.options(selectinload(Note.author))
+        if not search_terms(search_term):
+            return query.filter(false())
+        query = apply_search(query.filter(Note.viewable_by(user_id)), Note, search_term)
+        query = query.offset(offset)
+        if limit:
+            query = query.limit(limit)
+        return query
 
     @staticmethod
-    def get_user_notes(user_id: int):
-        return Note.query.filter_by(user_id=user_id).all()
+    def index_page_notes(user_id, limit: int = 0, offset: int = 0, cursor=None) -> List:
+        return Note.index_page_query(user_id, limit, offset, cursor).all()
 
-    def serialize(self):
-        from app.models.user import User
+    @staticmethod
+    def index_page_query(user_id, limit: int = 0, offset: int = 0, cursor=None):
+        query = Note.query.options(selectinload(Note.author)).filter(
+            Note.viewable_by(user_id)
+        )
+        if cursor is not None:
+            query = query.filter(keyset_filter(Note.date_posted, Note.id, cursor))
+        query = query.order_by(Note.date_posted.desc(), Note.id.desc())
+        if limit:
+            query = query.limit(limit)
+        return query.offset(offset)
+
+    @staticmethod
+    def get_user_notes(user_id: int, limit: int = 0, cursor=None) -> List:
+        return Note.user_notes_query(user_id, limit, cursor).all()
+
+    @staticmethod
+    def user_notes_query(user_id: int, limit: int = 0, cursor=None):
+        query = Note.query.filter(Note.user_id == user_id)
+        if cursor is not None:
+            query = query.filter(keyset_filter(Note.date_posted, Note.id, cursor))
+        query = query.order_by(Note.date_posted.desc(), Note.id.desc())
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def backfill_content_html(
+        render_all: bool = False, batch_size: int = 500, workers: int = None
+    ) -> int:
+        # markdown rendering is pure CPU work, so spread each batch over processes
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = workers or os.cpu_count() or 1
+        table = Note.__table__
+        statement = (
+            table.update()
+            .where(table.c.id == bindparam("note_id"))
+            .values(content_html=bindparam("html"))
+        )
+        rendered = 0
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                query = db.session.query(Note.id, Note.content).filter(
+                    Note.id > last_id
+                )
+                if not render_all:
+                    query = query.filter(Note.content_html.is_(None))
+                rows = query.order_by(Note.id).limit(batch_size).all()
+                if not rows:
+                    break
+                chunksize = max(1, len(rows) // (workers * 4))
+                html = executor.map(
+                    render_markdown,
+                    [content for _, content in rows],
+                    chunksize=chunksize,
+                )
+                db.session.execute(
+                    statement,
+                    [
+                        {"note_id": note_id, "html": note_html}
+                        for (note_id, _), note_html in zip(rows, html)
+                    ],
+                )
+                db.session.commit()
+                rendered += len(rows)
+                last_id = rows[-1][0]
+        return rendered
 
+    def serialize(self):
         return {
             "id": self.id,
             "title": self.title,
             "content": self.content,
+            "content_html": self.rendered_html,
             "Posted": self.date_posted,
-            "User": User.query.filter_by(id=self.user_id).first().serialize()
-            if self.user_id
-            else "",
+            "User": self.author.serialize() if self.author is not None else "",
         }
@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Dict
+from app import db
+
+
+class RevokedToken(db.Model):
+    jti: str = db.Column(db.String(32), primary_key=True)
+    expires: datetime = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"RevokedToken('{self.jti}', '{self.expires}')"
+
+    @staticmethod
+    def revoke(jti: str, expires: datetime) -> None:
+        if db.session.get(RevokedToken, jti) is None:
+            db.session.add(RevokedToken(jti=jti, expires=expires))
+        # expired tokens fail verification anyway, keep the list small
+        RevokedToken.query.filter(RevokedToken.expires < datetime.utcnow()).delete()
+        db.session.commit()
+
+    @staticmethod
+    def active() -> Dict[str, datetime]:
+        return dict(
+            db.session.query(RevokedToken.jti, RevokedToken.expires).filter(
+                RevokedToken.expires >= datetime.utcnow()
+            )
+        )
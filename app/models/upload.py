@@ -1,5 +1,5 @@
 from datetime import datetime
-from app import db
+from app import db, audit_log
 
 
 class Upload(db.Model):
@@ -12,7 +12,10 @@ class Upload(db.Model):
         default=None,
     )
     file_id = db.Column(
-        db.Integer, db.ForeignKey("file.id", ondelete="NO ACTION"), nullable=False
+        db.Integer,
+        db.ForeignKey("file.id", ondelete="NO ACTION"),
+        nullable=False,
+        index=True,
     )
 
     def __repr__(self) -> str:
@@ -32,7 +35,12 @@ class Upload(db.Model):
         return True
 
     @staticmethod
-    def record_upload(user_id: int, file_id: int) -> None:
-        ul: Upload = Upload(user_id, file_id)
-        db.session.add(ul)
-        db.session.commit()
+    def record_upload(user_id: int, file_id: int) -> bool:
+        # queued, the audit log inserts uploads in batches off the request thread
+        audit_log.record(
+            Upload,
+            upload_date=datetime.utcnow(),
+            user_id=user_id,
+            file_id=file_id,
+        )
+        return True
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+from app import db
+
+
+class UploadSession(db.Model):
+    id: str = db.Column(db.String(32), primary_key=True)
+    created: datetime = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
+    )
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=True,
+        default=None,
+    )
+    file_name: str = db.Column(db.String(100), nullable=False)
+    total_size: int = db.Column(db.BigInteger, nullable=True, default=None)
+    received: int = db.Column(db.BigInteger, nullable=False, default=0)
+    private: bool = db.Column(db.Boolean, nullable=False, default=False)
+    details: str = db.Column(db.String(200), nullable=True, default=None)
+
+    def __init__(
+        self,
+        file_name: str,
+        user_id: int = None,
+        total_size: Optional[int] = None,
+        private: bool = False,
+        details: str = None,
+    ) -> None:
+        self.id = uuid4().hex
+        self.created = datetime.utcnow()
+        self.file_name = file_name
+        self.user_id = user_id
+        self.total_size = total_size
+        self.received = 0
+        self.private = private
+        self.details = details
+
+    def __repr__(self) -> str:
+        return f"UploadSession('{self.id}', '{self.file_name}', '{self.received}')"
+
+    def save(self) -> None:
+        db.session.add(self)
+        db.session.commit()
+
+    def is_owned_by_user(self, user_id) -> bool:
+        return self.user_id is None or self.user_id == user_id
+
+    def is_complete(self) -> bool:
+        return self.total_size is None or self.received == self.total_size
+
+    def advance(self, offset: int, length: int) -> bool:
+        # compare and set on the offset only, of two requests for the same offset
+        # one is told to retry. it does not keep their bytes apart, upload_chunk
+        # holds a lock on the part file for that
+        updated = (
+            db.session.query(UploadSession)
+            .filter_by(id=self.id, received=offset)
+            .update({"received": offset + length}, synchronize_session=False)
+        )
+        db.session.commit()
+        db.session.refresh(self)
+        return updated == 1
+
+    @staticmethod
+    def get_stale(max_age: timedelta):
+        return UploadSession.query.filter(
+            UploadSession.created < datetime.utcnow() - max_age
+        ).all()
@@ -1,13 +1,20 @@
 from werkzeug.security import generate_password_hash, check_password_hash
+from flask import current_app, g
 from flask_login import UserMixin
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 from app import db, login_manager
+from app.cache import MemoryBackend
 from app.models.note import Note
 from app.models.file import File
 
+# user id -> column values, shared by the requests of this process
+_user_cache = MemoryBackend(max_entries=4096)
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return User.get_cached(int(user_id))
 
 
 class User(UserMixin, db.Model):
@@ -15,13 +22,17 @@ class User(UserMixin, db.Model):
     username: str = db.Column(db.String(20), unique=True, nullable=False)
     email: str = db.Column(db.String(120), unique=True, nullable=True)
     password_hash: str = db.Column(db.String(120), nullable=False)
-    notes = db.relationship("Note", backref="author", lazy=True)
-    files = db.relationship("File", backref="author", lazy=True)
+    # queries rather than lists, touching them loads nothing until filtered
+    notes = db.relationship("Note", backref="author", lazy="dynamic")
+    files = db.relationship("File", backref="author", lazy="dynamic")
     groups = db.relationship("Group", backref="author", lazy=True)
-    is_admin = db.Column(db.Boolean, nullable=False, default=False)
+    # mapped as admin, an attribute named is_admin would be shadowed by the method
+    admin: bool = db.Column(
+        "is_admin", db.Boolean, nullable=False, default=False, server_default=db.false()
+    )
 
     def is_admin(self) -> bool:
-        return self.is_admin
+        return self.admin
 
     def set_password(self, password) -> None:
         self.password_hash = generate_password_hash(password)
@@ -35,19 +46,49 @@ class User(UserMixin, db.Model):
     def __repr__(self) -> str:
         return f"User('{self.username}')"
 
-    def get_notes(self):
-        return Note.query.filter_by(user_id=self.id).all()
+    def get_notes(self, limit: int = 0, cursor=None):
+        return Note.get_user_notes(self.id, limit, cursor)
 
-    def get_files(self):
-        return File.query.filter_by(user_id=self.id).all()
+    def get_files(self, limit: int = 0, cursor=None):
+        return File.get_all_user_files(self.id, limit, cursor)
 
     def save(self) -> None:
         db.session.add(self)
         db.session.commit()
+        _user_cache.delete(self.id)
+
+    @staticmethod
+    def get_cached(user_id: int):
+        """Load a user without SQL when it was loaded recently.
+
+        Within a request the same instance is returned every time. Across
+        requests the column values are kept for USER_CACHE_TTL seconds and
+        merged back into the session, so other workers can see a changed user
+        up to that long after User.save.
+        """
+        users = g.setdefault("_users", {})
+        if user_id in users:
+            return users[user_id]
+        columns = _user_cache.get(user_id)
+        if columns is not None:
+            user = User(**columns)
+            make_transient_to_detached(user)
+            user = db.session.merge(user, load=False)
+        else:
+            user = db.session.get(User, user_id)
+            ttl = current_app.config.get("USER_CACHE_TTL", 30)
+            if user is not None and ttl:
+                columns = {
+                    attribute.key: getattr(user, attribute.key)
+                    for attribute in inspect(User).column_attrs
+                }
+                _user_cache.set(user_id, columns, ttl)
+        users[user_id] = user
+        return user
 
     @staticmethod
     def get_user(user_id: int):
-        user: User = User.query.filter_by(id=user_id).first()
+        user: User = User.get_cached(user_id)
         if user is None:
             raise Exception("User not found")
         return user
@@ -32,7 +32,11 @@ from .groups import (
     edit_group as edit_group,
     delete_group as delete_group,
 )
-from .index import index_page as index_page
+from .index import (
+    index_page as index_page,
+    note_feed as note_feed,
+    file_feed as file_feed,
+)
 from .auth import login as login, logout as logout, register as register
 from .bookmarks import (
     create_bookmark as create_bookmark,
@@ -1,5 +1,6 @@
-from flask import render_template, redirect, url_for, flash, Response
+from flask import render_template, redirect, url_for, flash, request, Response
 from flask_login import current_user, login_user, logout_user
+from app import login_throttle
 from app.models import User
 from app.forms import LoginForm, RegistrationForm
 from . import endpoint
@@ -17,10 +18,16 @@ def login():
         return redirect(url_for("routes.index_page"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
+        username = form.username.data
+        if login_throttle.retry_after(username, request.remote_addr):
+            flash("Too many failed login attempts, try again later")
+            return redirect(url_for("routes.login"))
+        user = User.query.filter_by(username=username).first()
         if user is None or not user.check_password(form.password.data):
+            login_throttle.failed(username, request.remote_addr)
             flash("Invalid username or password")
             return redirect(url_for("routes.login"))
+        login_throttle.succeeded(username, request.remote_addr)
         login_user(user, remember=form.remember_me.data)
         return redirect(url_for("routes.index_page"))
     return render_template("login.html", title="Sign In", form=form)
@@ -40,9 +47,9 @@ def register():
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
         user.set_password(form.password.data)
-        first_admin = User.query.filter_by(is_admin=True).first()
+        first_admin = User.query.filter_by(admin=True).first()
         if not first_admin:
-            user.is_admin = True
+            user.admin = True
         user.save()
         flash(f"New user {form.username.data} has been created!")
         if User.query.count() == 1:
@@ -1,21 +1,20 @@
 from flask import (
+    abort,
+    current_app,
     render_template,
     redirect,
     url_for,
     flash,
     request,
-    send_from_directory,
     Response,
 )
 from flask_login import current_user, login_required
-from app.models import File, Upload, Download, User, Deletion
+from app.models import File, Upload, Download, Deletion
 from app.forms import DeleteFileForm, FileUploadForm, EditFileForm
+from app.utils import send_stored_file, counts_as_download
 from werkzeug.utils import secure_filename as s_fn
-import os
 from . import endpoint
 
-_upload_folder: str = os.environ.get("UPLOAD_FOLDER")
-
 
 @endpoint.route("/file/upload", methods=["POST"])
 def upload_file():
@@ -41,17 +40,12 @@ def upload_file():
         else:
             raise Exception("Failed to create new file")
 
-        new_upload = Upload(
-            new_file.id,
-            current_user.id,
-        )
-        saved = new_upload.save()
+        saved = Upload.record_upload(current_user.id, new_file.id)
     else:
         new_file: File = File.query.filter_by(file_name=secure_filename).first()
-        new_upload = Upload(file_id=new_file.id)
-        saved = new_upload.save()
+        saved = Upload.record_upload(None, new_file.id)
     if saved and new_file.id is not None:
-        uploaded_file.save(os.path.join(_upload_folder, secure_filename))
+        new_file.store_upload(uploaded_file.stream)
         flash("File uploaded successfully")
         return redirect(url_for("routes.index_page"))
 
@@ -94,9 +88,10 @@ def edit_file(file_id) -> Response:
 @login_required
 def delete_file(file_id) -> Response:
     file: File = File.query.get_or_404(file_id)
+    if file.deleted:
+        abort(404)
     form = DeleteFileForm()
-    user = User.query.get_or_404(current_user.id)
-    if user.is_admin():
+    if current_user.is_admin():
         if request.method == "GET":
             return render_template(
                 "delete_file.html",
@@ -106,7 +101,7 @@ def delete_file(file_id) -> Response:
             )
         if form.validate_on_submit():
             file.delete()
-            Deletion(file_id, current_user.id).save()
+            Deletion.record_deletion(file_id, current_user.id, form.reason.data)
         flash("Your file has been deleted.")
         return redirect(url_for("routes.index_page"))
     else:
@@ -114,38 +109,27 @@ def delete_file(file_id) -> Response:
     return redirect(url_for("routes.index_page"))
 
 
-from flask import Response, make_response
-
-
 @endpoint.route("/file/<int:file_id>/download")
 def download_file(file_id) -> Response:
     file = File.query.get_or_404(file_id)
     if current_user.is_authenticated:
-        if not file.is_private() or file.is_owned_by_user(current_user.id):
-            Download.record_download(file_id, current_user.id)
-            # setting the content headers so that the browser knows to download the file
-            response = make_response(
-                send_from_directory(_upload_folder, file.file_name, as_attachment=True)
-            )
-            response.headers[
-                "Content-Disposition"
-            ] = f"attachment; filename={file.file_name}"
-            response.headers["Content-Type"] = "application/octet-stream"
-            return response
-    elif not file.is_private() or file.is_anonymous():
-        Download.record_download(file_id)
-        # setting the content headers so that the browser knows to download the file
-        response = make_response(
-            send_from_directory(_upload_folder, file.file_name, as_attachment=True)
+        user_id = current_user.id
+        allowed = not file.is_private() or file.is_owned_by_user(user_id)
+    else:
+        user_id = None
+        allowed = not file.is_private() or file.is_anonymous()
+    if allowed:
+        # octet-stream so that the browser always downloads the file
+        response = send_stored_file(
+            file,
+            current_app.config["UPLOAD_FOLDER"],
+            mimetype="application/octet-stream",
         )
-        response.headers[
-            "Content-Disposition"
-        ] = f"attachment; filename={file.file_name}"
-        response.headers["Content-Type"] = "application/octet-stream"
+        if counts_as_download(response):
+            Download.record_download(file_id, user_id)
         return response
-    else:
-        flash("You do not have permission to download this file.")
-        return redirect(url_for("routes.login"))
+    flash("You do not have permission to download this file.")
+    return redirect(url_for("routes.login"))
 
 
 @endpoint.route("/file/search", methods=["GET", "POST"])
@@ -156,7 +140,7 @@ def search_files() -> Response:
             id = current_user.id
         except AttributeError:
             id = None
-        files = File.search(search_term, id)
+        files = File.search(search_term, id, limit=50)
         if len(files) == 0:
             files = None
         return render_template(
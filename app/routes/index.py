@@ -1,23 +1,96 @@
-from flask import render_template, Response
+from flask import current_app, render_template, request, abort, session, Response
 from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from app import cache
 from app.models import Note, File
+from app.utils import decode_cursor, next_cursor
 from . import endpoint
 
+# stands in for the CSRF token of the session in cached pages
+_csrf_placeholder = b"__csrf_token__"
+
+
+def _page_size() -> int:
+    return current_app.config.get("INDEX_PAGE_SIZE", 24)
+
+
+def _current_user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+def _request_cursor():
+    try:
+        return decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        abort(400)
+
 
 @endpoint.route("/")
 @endpoint.route("/index")
 def index_page():
-    if current_user.is_authenticated:
-        user_id = current_user.id
-    else:
-        user_id = None
-    notes = Note.index_page_notes(user_id)
-    files = File.return_index_page_files(user_id)
-    print("Files on index page", files)
-    return render_template(
-        "index.html",
-        notes=notes,
-        files=files,
-        user=current_user,
-        title="Info_Hub",
+    # only the first page is rendered here, the rest is fetched by the feeds below
+    user_id = _current_user_id()
+    limit = _page_size()
+
+    def produce() -> Response:
+        notes = Note.index_page_notes(user_id, limit=limit)
+        files = File.return_index_page_files(user_id, limit=limit)
+        return Response(
+            render_template(
+                "index.html",
+                notes=notes,
+                files=files,
+                next_note_cursor=next_cursor(notes, limit),
+                next_file_cursor=next_cursor(files, limit),
+                user=current_user,
+                title="Info_Hub",
+            )
+        )
+
+    if user_id is not None or "_flashes" in session:
+        return produce()
+    # anonymous visitors share one page, the forms on it get their own CSRF token
+    csrf = current_app.config.get("WTF_CSRF_ENABLED", True)
+
+    def produce_shared() -> Response:
+        response = produce()
+        if csrf:
+            body = response.get_data().replace(
+                generate_csrf().encode(), _csrf_placeholder
+            )
+            response.set_data(body)
+        return response
+
+    response = cache.cached_response(
+        "index", "anonymous", produce_shared, "text/html", ("notes", "files")
+    )
+    if csrf:
+        body = response.get_data().replace(_csrf_placeholder, generate_csrf().encode())
+        response.set_data(body)
+    return response
+
+
+@endpoint.route("/index/notes")
+def note_feed() -> Response:
+    limit = _page_size()
+    notes = Note.index_page_notes(
+        _current_user_id(), limit=limit, cursor=_request_cursor()
+    )
+    response = Response(
+        render_template("note_feed.html", notes=notes, user=current_user)
+    )
+    response.headers["X-Next-Cursor"] = next_cursor(notes, limit) or ""
+    return response
+
+
+@endpoint.route("/index/files")
+def file_feed() -> Response:
+    limit = _page_size()
+    files = File.return_index_page_files(
+        _current_user_id(), limit=limit, cursor=_request_cursor()
+    )
+    response = Response(
+        render_template("file_feed.html", files=files, user=current_user)
     )
+    response.headers["X-Next-Cursor"] = next_cursor(files, limit) or ""
+    return response
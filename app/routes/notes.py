@@ -21,7 +21,7 @@ def add_note():
         note = Note(
             title=form.title.data,
             content=form.content.data,
-            author=current_user if current_user.is_authenticated else None,
+            user_id=current_user.id if current_user.is_authenticated else None,
             private=form.private.data,
         )
         note.save()
@@ -40,7 +40,7 @@ def edit_note(note_id):
             note.title = form.title.data
             note.content = form.content.data
             note.private = form.private.data
-            db.session.commit()
+            note.save()
             flash("Your note has been updated.")
             return redirect(url_for("routes.index_page"))
     else:
@@ -77,7 +77,7 @@ def search_notes() -> Response:
             id = current_user.id
         except AttributeError:
             id = None
-        notes = Note.search(search_term, id)
+        notes = Note.search(search_term, id, limit=50)
         if len(notes) == 0:
             notes = None
         return render_template(
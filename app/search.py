@@ -0,0 +1,71 @@
+import re
+from sqlalchemy import column, func, literal_column, or_, table
+from app import db
+
+_word = re.compile(r"\w+", re.UNICODE)
+_backends = {}
+
+# table name -> (full text table / index name, searchable columns), both are
+# created by the migrations
+SEARCH_INDEXES = {
+    "note": ("note_fts", ("title", "content")),
+    "file": ("file_fts", ("file_name", "details")),
+}
+
+
+def search_backend() -> str:
+    # sqlite gets fts5 virtual tables, postgres gets GIN indexed tsvectors
+    # anything else falls back to the old LIKE scan
+    url = str(db.engine.url)
+    if url not in _backends:
+        with db.engine.connect() as connection:
+            _backends[url] = _detect_backend(connection)
+    return _backends[url]
+
+
+def _detect_backend(connection) -> str:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        options = connection.exec_driver_sql("PRAGMA compile_options").all()
+        if any(option[0] == "ENABLE_FTS5" for option in options):
+            return "fts5"
+        return "like"
+    if dialect == "postgresql":
+        return "tsvector"
+    return "like"
+
+
+def _tsvector_sql(columns, table_name: str = None) -> str:
+    # must match the expression migration 0001 indexes, or postgres scans the table
+    prefix = f"{table_name}." if table_name else ""
+    document = " || ' ' || ".join(f"coalesce({prefix}{name}, '')" for name in columns)
+    return f"to_tsvector('simple', {document})"
+
+
+def search_terms(search_term: str) -> list:
+    return _word.findall(search_term or "")
+
+
+def apply_search(query, model, search_term: str):
+    """Filter and rank a model query by a search term, every word is prefix matched."""
+    words = search_terms(search_term)
+    table_name = model.__tablename__
+    fts_name, columns = SEARCH_INDEXES[table_name]
+    backend = search_backend()
+    if backend == "fts5":
+        match = " ".join(f'"{word}"*' for word in words)
+        fts = table(fts_name, column("rowid"), column("rank"))
+        return (
+            query.join(fts, fts.c.rowid == model.id)
+            .filter(literal_column(fts_name).op("MATCH")(match))
+            .order_by(fts.c.rank, model.date_posted.desc())
+        )
+    if backend == "tsvector":
+        document = literal_column(_tsvector_sql(columns, table_name))
+        ts_query = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+        return query.filter(document.op("@@")(ts_query)).order_by(
+            func.ts_rank_cd(document, ts_query).desc(), model.date_posted.desc()
+        )
+    return query.filter(
+        or_(*[getattr(model, name).contains(search_term) for name in columns])
+    ).order_by(model.date_posted.desc())
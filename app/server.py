@@ -0,0 +1,66 @@
+import multiprocessing
+from gunicorn.app.base import BaseApplication
+
+
+def server_options(config, **overrides) -> dict:
+    """Gunicorn settings from the app config, explicit overrides win.
+
+    Workers default to WEB_CONCURRENCY or 2 * CPUs + 1. With the gthread
+    worker each process also runs WEB_THREADS threads, so slow downloads and
+    uploads do not hold a whole process.
+    """
+    cpus = multiprocessing.cpu_count()
+    options = {
+        "bind": f"{config.get('WEB_HOST')}:{config.get('WEB_PORT')}",
+        "workers": config.get("WEB_CONCURRENCY") or cpus * 2 + 1,
+        "worker_class": config.get("WEB_WORKER_CLASS"),
+        "threads": config.get("WEB_THREADS"),
+        "preload_app": config.get("WEB_PRELOAD"),
+        "keepalive": config.get("WEB_KEEPALIVE"),
+        "timeout": config.get("WEB_TIMEOUT"),
+        "graceful_timeout": config.get("WEB_GRACEFUL_TIMEOUT"),
+        # recycle workers now and then so slow leaks cannot grow forever
+        "max_requests": config.get("WEB_MAX_REQUESTS"),
+        "max_requests_jitter": (config.get("WEB_MAX_REQUESTS") or 0) // 10,
+        "accesslog": "-",
+    }
+    options.update(
+        {key: value for key, value in overrides.items() if value is not None}
+    )
+    if options["worker_class"] == "gevent":
+        # gevent greenlets replace the thread pool
+        options.pop("threads")
+    return {key: value for key, value in options.items() if value is not None}
+
+
+class Server(BaseApplication):
+    """Runs the app under gunicorn, `kill -HUP` on the master reloads workers gracefully."""
+
+    def __init__(self, application, options: dict) -> None:
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set("post_fork", _post_fork)
+
+    def load(self):
+        from app import cache, create_app
+
+        if self.cfg.preload_app:
+            application = self.application
+        else:
+            # without preloading every worker builds its own app after the fork
+            application = create_app()
+        cache.check_workers(self.cfg.workers)
+        return application
+
+
+def _post_fork(server, worker) -> None:
+    # connections opened in the master must not be shared between workers
+    from app import db
+
+    with worker.app.application.app_context():
+        db.engine.dispose(close=False)
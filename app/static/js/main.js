@@ -43,3 +43,57 @@ document.addEventListener("DOMContentLoaded", function () {
     dropZone.addEventListener("drop", handleFileSelect, false);
   }
 });
+
+// Infinite scroll for the index page feeds
+function loadNextPage(feed, observer, sentinel) {
+  let cursor = feed.dataset.nextCursor;
+  if (!cursor || feed.dataset.loading) {
+    return;
+  }
+  feed.dataset.loading = "true";
+  fetch(feed.dataset.feedUrl + "?cursor=" + encodeURIComponent(cursor), {
+    credentials: "same-origin",
+  })
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error("Failed to load the next page");
+      }
+      feed.dataset.nextCursor = response.headers.get("X-Next-Cursor") || "";
+      return response.text();
+    })
+    .then(function (html) {
+      feed.insertAdjacentHTML("beforeend", html);
+      if (!feed.dataset.nextCursor) {
+        observer.unobserve(sentinel);
+      }
+    })
+    .catch(function (error) {
+      console.error(error);
+    })
+    .finally(function () {
+      delete feed.dataset.loading;
+    });
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  if (!("IntersectionObserver" in window)) {
+    return;
+  }
+  document.querySelectorAll("[data-feed-url]").forEach(function (feed) {
+    let sentinel = feed.nextElementSibling;
+    if (!feed.dataset.nextCursor || !sentinel) {
+      return;
+    }
+    let observer = new IntersectionObserver(
+      function (entries) {
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            loadNextPage(feed, observer, sentinel);
+          }
+        });
+      },
+      { rootMargin: "400px" }
+    );
+    observer.observe(sentinel);
+  });
+});
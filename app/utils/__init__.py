@@ -1,3 +1,18 @@
-from .config import init_db_config as init_db_config
-from .config import init_uploads_folder as init_uploads_folder
-from .config import init_secret_key as init_secret_key
+from .config import Settings as Settings
+from .config import get_settings as get_settings
+from .pagination import encode_cursor as encode_cursor
+from .pagination import decode_cursor as decode_cursor
+from .pagination import keyset_filter as keyset_filter
+from .pagination import next_cursor as next_cursor
+from .pagination import search_window as search_window
+from .formatting import human_readable_size as human_readable_size
+from .formatting import render_markdown as render_markdown
+from .sendfile import send_stored_file as send_stored_file
+from .sendfile import counts_as_download as counts_as_download
+from .blobstore import BlobStore as BlobStore
+from .engine import engine_options as engine_options
+from .engine import configure_engine as configure_engine
+from .engine import pool_collector as pool_collector
+from .engine import TimedQueuePool as TimedQueuePool
+from .streaming import stream_json as stream_json
+from .streaming import wants_stream as wants_stream
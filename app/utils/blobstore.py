@@ -0,0 +1,90 @@
+import hashlib, os, shutil, tempfile
+from typing import BinaryIO, Tuple
+
+_chunk_size = 1024 * 1024
+
+
+class BlobStore:
+    """Content addressed storage, blobs live at <root>/ab/cd/abcdef... by sha256."""
+
+    def __init__(self, root: str = None) -> None:
+        self.root = root
+
+    def init_app(self, app) -> None:
+        self.root = os.path.join(app.config["UPLOAD_FOLDER"], "blobs")
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    @staticmethod
+    def relative_path(sha256: str) -> str:
+        return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, self.relative_path(sha256))
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path_for(sha256))
+
+    def store_stream(self, stream: BinaryIO) -> Tuple[str, int]:
+        tmp_path, sha256, size = self.receive_stream(stream)
+        self.store_file(tmp_path, sha256)
+        return sha256, size
+
+    def receive_stream(self, stream: BinaryIO) -> Tuple[str, str, int]:
+        # hash while writing to a temp file in the store so the final move is a rename,
+        # the caller passes the temp path to store_file or removes it
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: stream.read(_chunk_size), b""):
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, hasher.hexdigest(), size
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_chunk_size), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def store_file(self, path: str, sha256: str) -> None:
+        # move an already hashed file into place, identical content is only kept once
+        target = self.path_for(sha256)
+        if os.path.exists(target):
+            os.remove(path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def link_file(self, path: str, sha256: str) -> None:
+        # like store_file but the source stays, remove it once the row is committed
+        target = self.path_for(sha256)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        os.close(fd)
+        try:
+            os.remove(tmp_path)
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                # another filesystem, or one without hard links
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def remove(self, sha256: str) -> None:
+        try:
+            os.remove(self.path_for(sha256))
+        except FileNotFoundError:
+            pass
@@ -1,113 +1,158 @@
-import os, hashlib
-
-
-def init_db_config():
-    env_file = os.environ.get("ENV_PATH")
-    try:
-        # First check for postgres database configuration, it will be used if it exists
-        # this can be easily extended to support other databases
-        os.environ.get("DATABASE_URL_POSTGRES")
-        os.environ["DB_TYPE"] = "postgres"
-        print("Found postgres database configuration")
-        print(
-            f'Connecting to postgres database {os.environ.get("DATABASE_URL_POSTGRES").split("@")[1].split("/")[1]}'
-        )
-    except KeyError:
-        print("DATABASE_URL_POSTGRES not found in .env file")
-        print("Looking for sqlite database configuration")
-        os.environ["DB_TYPE"] = "postgres"
-        try:
-            os.environ.get("SQLALCHEMY_DATABASE_URI_SQLITE")
-            print("Found sqlite database configuration")
-            print(
-                f'Connecting to sqlite database {os.environ.get("SQLALCHEMY_DATABASE_URI_SQLITE").split("///")[1].split(".")[0]}'
+import os, hashlib, logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Mapping
+from .engine import engine_options
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(
+    os.path.join(os.path.abspath(os.path.dirname(__file__)), os.pardir, os.pardir)
+)
+ENV_PATH = os.path.join(PROJECT_ROOT, ".env")
+
+
+def _flag(environ: Mapping, name: str, default: bool) -> bool:
+    value = environ.get(name)
+    if value in (None, ""):
+        return default
+    return value not in ("0", "false", "False")
+
+
+def database_uri(environ: Mapping) -> str:
+    # postgres is used when it is configured, this can be extended to other databases
+    if environ.get("DATABASE_URL_POSTGRES"):
+        logger.info("Found postgres database configuration")
+        return environ["DATABASE_URL_POSTGRES"]
+    if environ.get("DATABASE_URL_SQLITE"):
+        logger.info("Found sqlite database configuration")
+        return environ["DATABASE_URL_SQLITE"]
+    # the names read before DATABASE_URL_*, older .env files still set them
+    for name in ("SQLALCHEMY_DATABASE_URI", "SQLALCHEMY_DATABASE_URI_SQLITE"):
+        if environ.get(name):
+            logger.warning(
+                "%s is deprecated, set DATABASE_URL_POSTGRES or "
+                "DATABASE_URL_SQLITE instead",
+                name,
             )
-        except KeyError:
-            # if no database configuration is found, set a default sqlite database configuration
-            print("DATABASE_URL_SQLITE not found in .env file")
-            print("Setting default sqlite database configuration")
-            os.environ["SQLALCHEMY_DATABASE_URI_SQLITE"] = "sqlite:///notes.db"
-            print("connecting to default sqlite database notes.db")
-            print("writing default sqlite database configuration to .env file")
-            with open(env_file, "a") as f:
-                f.write(f"DATABASE_URL_SQLITE=sqlite:///notes.db")
-    # additional configuration can be added here
-    if os.environ["DB_TYPE"] == "postgres":
-        SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL_POSTGRES")
-    elif os.environ["DB_TYPE"] == "sqlite":
-        SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL_SQLITE")
-    else:
-        raise Exception("Database type not supported")
-    os.environ["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
-    # write SQLALCHEMY_DATABASE_URI to .env file if not already present
-    with open(env_file, "r") as f:
-        lines = f.readlines()
-    if not any("SQLALCHEMY_DATABASE_URI" in line for line in lines):
-        with open(env_file, "w") as f:
-            for line in lines:
-                if "SQLALCHEMY_DATABASE_URI" not in line:
-                    f.write(line)
-
-        with open(env_file, "a") as f:
-            f.write(f"""\nSQLALCHEMY_DATABASE_URI='{SQLALCHEMY_DATABASE_URI}'""")
-
-    return
-
-
-def init_uploads_folder():
-    env_file = os.environ.get("ENV_PATH")
-    root = os.environ.get("PROJECT_ROOT")
-    try:
-        UPLOADS_FOLDER = os.environ.get("UPLOAD_FOLDER")
-        print("Found UPLOAD_FOLDER in .env file")
-        # update the uploads folder in the .env file to the absolute path if not already an absolute path
-        print("checking if UPLOAD_FOLDER is an absolute path")
-        if not os.path.isabs(os.environ["UPLOAD_FOLDER"]):
-            print("UPLOAD_FOLDER is not an absolute path")
-            print("updating UPLOAD_FOLDER to absolute path")
-            UPLOADS_FOLDER = os.path.join(root, os.environ["UPLOAD_FOLDER"])
-            os.environ["UPLOAD_FOLDER"] = UPLOADS_FOLDER
-            print("writing absolute path to .env file")
-            # first remove the old UPLOAD_FOLDER from the .env file
-            with open(env_file, "r") as f:
-                lines = f.readlines()
-            with open(env_file, "w") as f:
-                for line in lines:
-                    if not line.startswith("UPLOAD_FOLDER"):
-                        f.write(line)
-            with open(env_file, "a") as f:
-                f.write(f"""\nUPLOAD_FOLDER='{os.environ["UPLOAD_FOLDER"]}\'""")
-        else:
-            print("UPLOAD_FOLDER is already an absolute path")
-    except KeyError:
-        print("UPLOAD_FOLDER not found in .env file")
-        print("Setting default UPLOAD_FOLDER")
-        UPLOADS_FOLDER = os.path.join(root, "uploads")
-        os.environ["UPLOAD_FOLDER"] = UPLOADS_FOLDER
-        # update the uploads folder in the .env file to the absolute path
-        with open(env_file, "a") as f:
-            f.write(f"""\nUPLOAD_FOLDER='{os.environ["UPLOAD_FOLDER"]}\'""")
-        print("writing default UPLOAD_FOLDER to .env file")
-    # additional configuration can be added here
-    # for example, to add support for other databases, add the database configuration to the .env file
-    if not os.path.exists(os.environ["UPLOAD_FOLDER"]):
-        print("creating uploads folder")
-        os.mkdir(os.environ["UPLOAD_FOLDER"])
-    return
-
-
-def init_secret_key():
-    env_file = os.environ.get("ENV_PATH")
-    try:
-        os.environ.get("SECRET_KEY")
-        print("Found SECRET_KEY in .env file")
-    except KeyError:
-        print("SECRET_KEY not found in .env file")
-        print("Setting default SECRET_KEY")
-        SECRET_KEY = hashlib.sha256(os.urandom(64)).hexdigest()
-        os.environ["SECRET_KEY"] = SECRET_KEY
-        print("generated a new SECRET_KEY")
-        print("writing default SECRET_KEY to .env file")
-        with open(env_file, "a") as f:
-            f.write(f'\nSECRET_KEY={os.environ["SECRET_KEY"]}')
-    return
+            return environ[name]
+    logger.info("No database configured, using the default sqlite database")
+    return "sqlite:///notes.db"
+
+
+def uploads_folder(environ: Mapping) -> str:
+    # relative paths are relative to the project root
+    folder = environ.get("UPLOAD_FOLDER") or "uploads"
+    if not os.path.isabs(folder):
+        folder = os.path.join(PROJECT_ROOT, folder)
+    return folder
+
+
+def secret_key(environ: Mapping) -> str:
+    if environ.get("SECRET_KEY"):
+        return environ["SECRET_KEY"]
+    # sessions and API tokens will not survive a restart, nor work across
+    # workers started without --preload
+    logger.warning("SECRET_KEY is not set, using a random key for this process")
+    return hashlib.sha256(os.urandom(64)).hexdigest()
+
+
+@dataclass(frozen=True)
+class Settings:
+    """The app configuration, resolved once from the environment and .env.
+
+    Loaded into app.config by create_app. Nothing here writes files, so
+    importing the app or starting several workers at once has no side effects.
+    """
+
+    SQLALCHEMY_DATABASE_URI: str
+    UPLOAD_FOLDER: str
+    SECRET_KEY: str
+    # pool sizing and timeouts per database type, overridable with DB_POOL_* vars
+    SQLALCHEMY_ENGINE_OPTIONS: dict = field(default_factory=dict)
+    SQLALCHEMY_TRACK_MODIFICATIONS: bool = False
+    SQLALCHEMY_ECHO: bool = False
+    # sqlite connection pragmas, see configure_engine
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # serve downloads through the front end server: "x-accel-redirect" or "x-sendfile"
+    SENDFILE_MODE: str = None
+    SENDFILE_PREFIX: str = "/protected/"
+    USE_X_SENDFILE: bool = False
+    # audit rows are written in batches by a background thread unless AUDIT_ASYNC=0
+    AUDIT_ASYNC: bool = True
+    AUDIT_BATCH_SIZE: int = 200
+    AUDIT_FLUSH_INTERVAL: float = 1.0
+    AUDIT_QUEUE_SIZE: int = 10000
+    # log (or raise with QUERY_BUDGET_MODE=raise) when a request runs more queries
+    QUERY_BUDGET: int = 0
+    QUERY_BUDGET_MODE: str = "log"
+    # notes and files rendered per index page request, the rest load on scroll
+    INDEX_PAGE_SIZE: int = 24
+    # listing pages and the anonymous / page served from cache: "memory" (per
+    # process, so it is turned off when `flask serve` runs more than one worker),
+    # "redis" (docker-compose.yml runs one) or "none"
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL: float = 10
+    CACHE_MAX_ENTRIES: int = 1024
+    # seconds a loaded user is reused by later requests, 0 to always query
+    USER_CACHE_TTL: float = 30
+    # bearer tokens for the JSON API, signed with SECRET_KEY
+    API_TOKEN_TTL: int = 3600
+    API_TOKEN_REVOCATION_REFRESH: float = 30
+    # failed password checks allowed per username and address, and per address
+    # alone, within the window. shared between workers with CACHE_BACKEND=redis
+    LOGIN_MAX_ATTEMPTS: int = 5
+    LOGIN_MAX_ATTEMPTS_PER_ADDRESS: int = 20
+    LOGIN_THROTTLE_WINDOW: float = 300
+    # production server settings used by `flask serve`
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 4202
+    WEB_CONCURRENCY: int = 0
+    WEB_WORKER_CLASS: str = "gthread"
+    WEB_THREADS: int = 4
+    WEB_PRELOAD: bool = True
+    WEB_KEEPALIVE: int = 5
+    WEB_TIMEOUT: int = 60
+    WEB_GRACEFUL_TIMEOUT: int = 30
+    WEB_MAX_REQUESTS: int = 0
+
+    @classmethod
+    def from_env(cls, environ: Mapping = None) -> "Settings":
+        environ = os.environ if environ is None else environ
+        values = {}
+        # everything else is read as the type of its default
+        for name, setting in cls.__dataclass_fields__.items():
+            raw = environ.get(name)
+            if raw in (None, "") or setting.type in ("dict", dict):
+                continue
+            if setting.type in ("bool", bool):
+                values[name] = _flag(environ, name, setting.default)
+            elif setting.type in ("int", int):
+                values[name] = int(raw)
+            elif setting.type in ("float", float):
+                values[name] = float(raw)
+            else:
+                values[name] = raw
+        uri = database_uri(environ)
+        values.update(
+            SQLALCHEMY_DATABASE_URI=uri,
+            SQLALCHEMY_ENGINE_OPTIONS=engine_options(uri, environ),
+            UPLOAD_FOLDER=uploads_folder(environ),
+            SECRET_KEY=secret_key(environ),
+        )
+        values["USE_X_SENDFILE"] = values.get("SENDFILE_MODE") == "x-sendfile"
+        return cls(**values)
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Settings from the environment, .env values fill in what is not set."""
+    import dotenv
+
+    if os.path.exists(ENV_PATH):
+        dotenv.load_dotenv(dotenv_path=ENV_PATH)
+    return Settings.from_env()
@@ -0,0 +1,137 @@
+import threading, time, weakref
+from typing import Mapping
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_seconds += time.perf_counter() - start
+
+
+def engine_options(database_uri: str, environ: Mapping) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the database in use, DB_POOL_* env vars win.
+
+    Each request thread holds at most one connection, so server side databases
+    get a pool the size of WEB_THREADS with a little overflow instead of the
+    SQLAlchemy default of up to 15 connections per worker process.
+    """
+
+    def setting(name: str, default, cast=int):
+        value = environ.get(name)
+        return default if value in (None, "") else cast(value)
+
+    url = make_url(database_uri)
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # flask-sqlalchemy uses a StaticPool for in memory databases
+            return {}
+        return {
+            "poolclass": TimedQueuePool,
+            "pool_size": setting("DB_POOL_SIZE", 5),
+            "max_overflow": setting("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": setting("DB_POOL_TIMEOUT", 30, float),
+        }
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": setting("DB_POOL_SIZE", setting("WEB_THREADS", 4)),
+        "max_overflow": setting("DB_MAX_OVERFLOW", 2),
+        "pool_timeout": setting("DB_POOL_TIMEOUT", 10, float),
+        # connections are replaced before servers or proxies drop them as idle
+        "pool_recycle": setting("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": setting(
+            "DB_POOL_PRE_PING", True, lambda value: value not in ("0", "false", "False")
+        ),
+    }
+
+
+def configure_engine(engine, config) -> None:
+    """Connection level settings that cannot be passed as engine options."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {
+        # readers no longer block the writer, which is what "database is locked" was
+        "journal_mode": config["SQLITE_JOURNAL_MODE"],
+        "synchronous": config["SQLITE_SYNCHRONOUS"],
+        "busy_timeout": config["SQLITE_BUSY_TIMEOUT"],
+        "mmap_size": config["SQLITE_MMAP_SIZE"],
+    }
+    if engine.url.database in (None, "", ":memory:"):
+        pragmas.pop("journal_mode")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def pool_collector(engine):
+    """Metrics collector with the connection pool state of an engine."""
+    # the collector must not keep a disposed app's engine alive
+    engine_ref = weakref.ref(engine)
+
+    def collect() -> list:
+        engine = engine_ref()
+        pool = engine.pool if engine is not None else None
+        if not isinstance(pool, QueuePool):
+            return []
+        lines = []
+        gauges = (
+            ("db_pool_size", "Connections kept open by the pool.", pool.size()),
+            ("db_pool_checked_out", "Connections in use.", pool.checkedout()),
+            (
+                "db_pool_overflow",
+                "Connections opened beyond the pool size.",
+                # overflow() counts up from -pool_size while the pool fills
+                max(pool.overflow(), 0),
+            ),
+        )
+        for name, help_text, value in gauges:
+            lines += [
+                f"# HELP {name} {help_text}",
+                f"# TYPE {name} gauge",
+                f"{name} {value}",
+            ]
+        if isinstance(pool, TimedQueuePool):
+            counters = (
+                ("db_pool_checkouts_total", "Connection checkouts.", pool.checkouts),
+                ("db_pool_timeouts_total", "Checkouts that timed out.", pool.timeouts),
+                (
+                    "db_pool_wait_seconds_total",
+                    "Time spent waiting for a connection.",
+                    pool.wait_seconds,
+                ),
+            )
+            for name, help_text, value in counters:
+                lines += [
+                    f"# HELP {name} {help_text}",
+                    f"# TYPE {name} counter",
+                    f"{name} {value}",
+                ]
+        return lines
+
+    return collect
@@ -0,0 +1,22 @@
+def human_readable_size(num_bytes: int) -> str:
+    # same units and precision the file cards have always shown
+    if num_bytes is None:
+        return ""
+    size_kb = num_bytes / 1024
+    size_mb = size_kb / 1024
+    size_gb = size_mb / 1024
+    if num_bytes < 1024:
+        return f"{num_bytes} B"
+    elif size_kb < 1024:
+        return f"{size_kb:.2f} KB"
+    elif size_mb < 1024:
+        return f"{size_mb:.2f} MB"
+    return f"{size_gb:.2f} GB"
+
+
+def render_markdown(content: str) -> str:
+    # module level so it can be shipped to worker processes by the backfill,
+    # markdown is imported on first use to keep it out of the startup path
+    import markdown
+
+    return markdown.markdown(content or "")
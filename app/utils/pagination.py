@@ -0,0 +1,55 @@
+import base64, binascii
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(date_posted: datetime, row_id: int) -> str:
+    # the cursor is opaque to clients, it only has to round trip through decode_cursor
+    raw = f"{date_posted.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_posted, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(date_posted), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_filter(date_column, id_column, cursor: Tuple[datetime, int]):
+    # rows strictly after the cursor when ordered by (date_posted desc, id desc)
+    date_posted, row_id = cursor
+    return or_(
+        date_column < date_posted,
+        and_(date_column == date_posted, id_column < row_id),
+    )
+
+
+def next_cursor(rows, limit: int) -> Optional[str]:
+    # a full page means there may be more rows, so hand back the position of the last one
+    if limit and len(rows) == limit:
+        return encode_cursor(rows[-1].date_posted, rows[-1].id)
+    return None
+
+
+# largest page a search may ask for, a bigger limit is cut down to this
+MAX_SEARCH_LIMIT = 100
+
+
+def search_window(data: dict, default_limit: int = 10) -> Tuple[int, int]:
+    # (limit, offset) from a search request body, clamped to MAX_SEARCH_LIMIT
+    limit, skip = data.get("limit", default_limit), data.get("skip", 0)
+    if isinstance(limit, bool) or isinstance(skip, bool):
+        raise ValueError("Invalid limit or skip")
+    try:
+        limit, skip = int(limit), int(skip)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid limit or skip")
+    if limit < 1 or skip < 0:
+        raise ValueError("Invalid limit or skip")
+    return min(limit, MAX_SEARCH_LIMIT), skip
@@ -0,0 +1,156 @@
+import os
+from datetime import timezone
+from urllib.parse import quote
+from flask import Response, current_app, request, send_file
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound, RequestedRangeNotSatisfiable
+
+# more ranges than this in one request are answered with the whole file
+_max_ranges = 16
+_chunk_size = 64 * 1024
+
+
+def send_stored_file(file, directory: str, mimetype: str = None) -> Response:
+    """Send an uploaded file with ETag, Last-Modified and byte range support.
+
+    When the file has a stored content hash, conditional requests are answered
+    from the database row alone and never touch the file on disk.
+    """
+    etag = file.content_hash
+    last_modified = file.date_posted.replace(microsecond=0)
+    if etag is not None and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return _cache_headers(response, file)
+
+    path = safe_join(directory, file.storage_name)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    mode = current_app.config.get("SENDFILE_MODE")
+    if mode == "x-accel-redirect":
+        response = _accel_redirect(file, mimetype)
+    elif _is_multi_range() and _if_range_matches(etag, last_modified):
+        response = _multi_range(path, os.path.getsize(path), mimetype)
+    else:
+        # werkzeug would answer 416 to too many ranges, RFC 9110 lets a server
+        # ignore Range instead. it also takes a later If-Range date as a match,
+        # RFC 9110 asks for the whole file unless the date is exact. without a
+        # content hash the etag is made up by werkzeug, so it checks that one
+        checked = etag is not None or request.if_range.date is not None
+        stale = checked and not _if_range_matches(etag, last_modified)
+        if _has_too_many_ranges() or stale:
+            request.environ.pop("HTTP_RANGE", None)
+        # single ranges and the X-Sendfile header are handled by werkzeug
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=True,
+            download_name=file.file_name,
+            conditional=True,
+            etag=etag if etag is not None else True,
+            last_modified=last_modified,
+        )
+    if etag is not None:
+        response.set_etag(etag)
+    response.last_modified = last_modified
+    return _cache_headers(response, file)
+
+
+def counts_as_download(response: Response) -> bool:
+    # revalidations and resumed transfers are not new downloads
+    if response.status_code == 304:
+        return False
+    if request.range is None or len(request.range.ranges) != 1:
+        return True
+    start, _ = request.range.ranges[0]
+    return start == 0
+
+
+def _cache_headers(response: Response, file) -> Response:
+    response.cache_control.no_cache = True
+    if file.is_private():
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def _accel_redirect(file, mimetype: str = None) -> Response:
+    # nginx serves the bytes from an internal location, ranges included
+    prefix = current_app.config.get("SENDFILE_PREFIX", "/protected/")
+    response = Response(mimetype=mimetype or "application/octet-stream")
+    response.headers["X-Accel-Redirect"] = (
+        prefix.rstrip("/") + "/" + quote(file.storage_name)
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename*=UTF-8''{quote(file.file_name)}"
+    )
+    return response
+
+
+def _is_multi_range() -> bool:
+    return request.range is not None and 1 < len(request.range.ranges) <= _max_ranges
+
+
+def _has_too_many_ranges() -> bool:
+    return request.range is not None and len(request.range.ranges) > _max_ranges
+
+
+def _if_range_matches(etag: str, last_modified) -> bool:
+    if_range = request.if_range
+    if if_range.etag is None and if_range.date is None:
+        return True
+    if if_range.etag is not None:
+        return etag is not None and if_range.etag == etag
+    # a date validator has to match Last-Modified exactly, to the second, and
+    # werkzeug parses it as UTC while date_posted is stored naive
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return if_range.date.replace(microsecond=0) == last_modified.replace(microsecond=0)
+
+
+def _multi_range(path: str, length: int, mimetype: str = None) -> Response:
+    ranges = []
+    for start, stop in request.range.ranges:
+        if start < 0:
+            start, stop = max(length + start, 0), length
+        stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    if not ranges:
+        raise RequestedRangeNotSatisfiable(length=length)
+
+    boundary = os.urandom(16).hex()
+    content_type = mimetype or "application/octet-stream"
+
+    def generate():
+        with open(path, "rb") as f:
+            for start, stop in ranges:
+                yield (
+                    f"\r\n--{boundary}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n"
+                ).encode()
+                f.seek(start)
+                remaining = stop - start
+                while remaining:
+                    chunk = f.read(min(_chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = Response(
+        generate(),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        direct_passthrough=True,
+    )
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
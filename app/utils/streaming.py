@@ -0,0 +1,83 @@
+import decimal, json, uuid
+from datetime import date
+from flask import Response, request, stream_with_context
+from werkzeug.http import http_date
+from .pagination import encode_cursor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# bytes buffered before a chunk is written to the client
+_chunk_size = 64 * 1024
+
+
+def _default(value):
+    # the conversions jsonify makes for what serialize() returns
+    if isinstance(value, date):
+        return http_date(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+
+    def dumps(value) -> bytes:
+        # orjson would write datetimes as ISO 8601, pass them to _default instead
+        return orjson.dumps(
+            value,
+            default=_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS,
+        )
+
+else:
+
+    def dumps(value) -> bytes:
+        return json.dumps(
+            value, default=_default, sort_keys=True, separators=(",", ":")
+        ).encode()
+
+
+def wants_stream() -> bool:
+    # streaming is opt in with ?stream=1, the body is the same as without it
+    return request.args.get("stream") == "1"
+
+
+def stream_json(
+    key: str, query, page_size: int = None, batch_size: int = 500, **fields
+) -> Response:
+    """Respond with {key: [row.serialize(), ...], **fields} written as rows arrive.
+
+    The query is read batch_size rows at a time with yield_per, so neither the
+    rows nor the encoded body are held in memory at once. Given a page_size
+    (0 for no limit) the object ends with the next_cursor next_cursor() gives.
+    """
+
+    def generate():
+        head = dumps(fields)[:-1] if fields else b"{"
+        buffer = [head, b"," if fields else b"", b'"', key.encode(), b'":[']
+        size = count = 0
+        last = None
+        for row in query.yield_per(batch_size):
+            encoded = dumps(row.serialize())
+            buffer.append(b"," + encoded if count else encoded)
+            size += len(encoded)
+            count += 1
+            last = row
+            if size >= _chunk_size:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        buffer.append(b"]")
+        if page_size is not None:
+            cursor = None
+            if page_size and count == page_size:
+                cursor = encode_cursor(last.date_posted, last.id)
+            buffer.append(b',"next_cursor":' + dumps(cursor))
+        buffer.append(b"}\n")
+        yield b"".join(buffer)
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
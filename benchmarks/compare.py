@@ -0,0 +1,48 @@
+"""Compare two benchmark result files.
+
+python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import argparse, json, sys
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0,
+        help="exit non-zero when a p95 regresses by more than this percentage",
+    )
+    args = parser.parse_args(argv)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    print(
+        f"{'scenario':<20}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'queries':>10}"
+    )
+    regressed = False
+    for name, after in candidate["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            print(f"{name:<20}{'-':>12}{after['p95_ms']:>12.2f}{'new':>9}")
+            continue
+        change = (after["p95_ms"] - before["p95_ms"]) / (before["p95_ms"] or 1) * 100
+        queries = f"{before['queries_per_request']}->{after['queries_per_request']}"
+        print(
+            f"{name:<20}{before['p95_ms']:>12.2f}{after['p95_ms']:>12.2f}"
+            f"{change:>8.1f}%{queries:>10}"
+        )
+        if args.threshold and change > args.threshold:
+            regressed = True
+    print(f"peak rss {baseline['peak_rss_mb']} MB -> {candidate['peak_rss_mb']} MB")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Benchmark the API against a seeded database.
+
+    python -m benchmarks.run --notes 100000 --files 10000 --requests 200
+
+The database and upload folder are created in a temporary directory unless
+--database (any SQLAlchemy URL, e.g. a throwaway postgres database) is given.
+Results are printed and saved to benchmarks/results/<timestamp>-<commit>.json,
+compare two runs with `python -m benchmarks.compare`. The listing cache is off
+unless --cache memory is given, which adds the cache hits and misses per scenario.
+"""
+
+import argparse, io, json, os, platform, resource, statistics, subprocess, sys
+import tempfile, threading, time
+from datetime import datetime
+
+_here = os.path.dirname(os.path.abspath(__file__))
+_results_folder = os.path.join(_here, "results")
+
+
+def _configure_environment(args) -> str:
+    # must run before create_app, the settings are read from the environment once
+    workdir = args.workdir or tempfile.mkdtemp(prefix="notes-bench-")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["SECRET_KEY"] = "benchmark"
+    if args.database and not args.database.startswith("sqlite"):
+        os.environ["DATABASE_URL_POSTGRES"] = args.database
+    else:
+        os.environ["DATABASE_URL_POSTGRES"] = ""
+        os.environ["DATABASE_URL_SQLITE"] = args.database or (
+            "sqlite:///" + os.path.join(workdir, "bench.db")
+        )
+    os.environ.setdefault("AUDIT_FLUSH_INTERVAL", "0.2")
+    # without the cache the listing scenarios measure their SQL, not cache hits
+    os.environ["CACHE_BACKEND"] = args.cache
+    return workdir
+
+
+def _percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=_here,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class _QueryCounter:
+    """Counts statements run by the benchmarking thread, audit writes are excluded."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._thread = threading.get_ident()
+
+    def __call__(self, *args) -> None:
+        if threading.get_ident() == self._thread:
+            self.count += 1
+
+
+def _scenarios(first_file_id: int, deep_skip: int) -> list:
+    # name, client ("anonymous" or "user"), method, url, request kwargs factory
+    upload_counter = iter(range(10**9))
+    bulk_notes = "".join(
+        json.dumps({"title": f"bulk {i}", "content": f"imported *note* {i}"}) + "\n"
+        for i in range(200)
+    ).encode()
+    return [
+        ("notes_page", "anonymous", "GET", "/api/notes?limit=20", dict),
+        ("notes_page_user", "user", "GET", "/api/notes?limit=20", dict),
+        ("files_page", "anonymous", "GET", "/api/files?limit=20", dict),
+        ("files_page_user", "user", "GET", "/api/files?limit=20", dict),
+        (
+            "files_deep_offset",
+            "anonymous",
+            "GET",
+            f"/api/files?limit=20&skip={deep_skip}",
+            dict,
+        ),
+        ("user_notes", "user", "GET", "/api/user/notes", dict),
+        ("user_notes_stream", "user", "GET", "/api/user/notes?stream=1", dict),
+        ("user_notes_page", "user", "GET", "/api/user/notes?limit=20", dict),
+        ("user_files", "user", "GET", "/api/user/files", dict),
+        ("user_files_page", "user", "GET", "/api/user/files?limit=20", dict),
+        (
+            "note_search",
+            "user",
+            "POST",
+            "/api/note/search",
+            lambda: {"json": {"search_term": "budget rev"}},
+        ),
+        (
+            "file_search",
+            "user",
+            "POST",
+            "/api/file/search",
+            lambda: {"json": {"search_term": "draft"}},
+        ),
+        (
+            "file_download",
+            "anonymous",
+            "GET",
+            f"/api/file/{first_file_id}/download",
+            dict,
+        ),
+        (
+            "file_upload",
+            "user",
+            "POST",
+            "/api/file/upload",
+            lambda: {
+                "data": {
+                    "file": (
+                        io.BytesIO(os.urandom(32 * 1024)),
+                        f"upload_{next(upload_counter)}.bin",
+                    )
+                },
+                "content_type": "multipart/form-data",
+            },
+        ),
+        ("notes_export", "user", "GET", "/api/notes/export", dict),
+        (
+            # last, every request adds 200 notes
+            "notes_bulk_import",
+            "user",
+            "POST",
+            "/api/notes/bulk",
+            lambda: {"data": bulk_notes, "content_type": "application/x-ndjson"},
+        ),
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--downloads", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=100, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="per scenario")
+    parser.add_argument("--database", help="SQLAlchemy URL, defaults to sqlite")
+    parser.add_argument("--workdir", help="folder for the database and uploads")
+    parser.add_argument("--only", action="append", help="run only these scenarios")
+    parser.add_argument(
+        "--cache",
+        choices=["none", "memory"],
+        default="none",
+        help="listing cache backend, none measures the queries behind every page",
+    )
+    parser.add_argument(
+        "--max-queries",
+        type=int,
+        default=0,
+        help="exit non-zero when a scenario runs more queries per request",
+    )
+    parser.add_argument("--output", help="results file, defaults to benchmarks/results")
+    args = parser.parse_args(argv)
+
+    workdir = _configure_environment(args)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app, audit_log, cache, db
+    from app.commands import init_db
+    from app.models import File
+    from .seed import PASSWORD, seed
+
+    app = create_app(WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        init_db()
+        started = time.perf_counter()
+        dataset = seed(
+            users=args.users,
+            notes=args.notes,
+            files=args.files,
+            downloads=args.downloads,
+        )
+        seed_seconds = time.perf_counter() - started
+        first_file = (
+            File.query.filter_by(private=False, deleted=False).order_by(File.id).first()
+        )
+        first_file_id = first_file.id if first_file else 1
+        dialect = db.engine.dialect.name
+
+    clients = {"anonymous": app.test_client(), "user": app.test_client()}
+    clients["user"].post(
+        "/api/login",
+        json={"username": "bench0", "password": PASSWORD, "remember_me": False},
+    )
+    counter = _QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter)
+
+    results = {}
+    failed = False
+    for name, client_name, method, url, make_kwargs in _scenarios(
+        first_file_id, args.files // 2
+    ):
+        if args.only and name not in args.only:
+            continue
+        client = clients[client_name]
+        for _ in range(args.warmup):
+            client.open(url, method=method, **make_kwargs()).close()
+        timings, queries, statuses = [], [], {}
+        hits, misses = cache.stats()
+        for _ in range(args.requests):
+            kwargs = make_kwargs()
+            before = counter.count
+            started = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            response.get_data()
+            timings.append((time.perf_counter() - started) * 1000)
+            response.close()
+            queries.append(counter.count - before)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        results[name] = {
+            "p50_ms": round(_percentile(timings, 50), 3),
+            "p95_ms": round(_percentile(timings, 95), 3),
+            "p99_ms": round(_percentile(timings, 99), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries_per_request": max(queries),
+            "status": statuses,
+        }
+        if args.cache != "none":
+            after_hits, after_misses = cache.stats()
+            results[name]["cache_hits"] = after_hits - hits
+            results[name]["cache_misses"] = after_misses - misses
+        if args.max_queries and max(queries) > args.max_queries:
+            failed = True
+    event.remove(Engine, "before_cursor_execute", counter)
+    audit_log.flush()
+
+    report = {
+        "commit": _commit(),
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": dialect,
+        "cache": args.cache,
+        "workdir": workdir,
+        "dataset": dataset,
+        "seed_seconds": round(seed_seconds, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "scenarios": results,
+    }
+    header = f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}"
+    print(header + (f"{'hits':>7}{'misses':>8}" if args.cache != "none" else ""))
+    for name, result in results.items():
+        line = (
+            f"{name:<20}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+            f"{result['p99_ms']:>10.2f}{result['queries_per_request']:>9}"
+        )
+        if "cache_hits" in result:
+            line += f"{result['cache_hits']:>7}{result['cache_misses']:>8}"
+        print(line)
+    print(f"peak rss {report['peak_rss_mb']} MB, seeded in {report['seed_seconds']}s")
+
+    output = args.output
+    if output is None:
+        os.makedirs(_results_folder, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(_results_folder, f"{stamp}-{report['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+    if failed:
+        print(f"a scenario ran more than {args.max_queries} queries per request")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
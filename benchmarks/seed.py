@@ -0,0 +1,124 @@
+import io, os, random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+PASSWORD = "bench"
+
+_words = (
+    "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima "
+    "mike november oscar papa quebec romeo sierra tango uniform victor whiskey "
+    "xray yankee zulu meeting budget report draft idea todo review release"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_words) for _ in range(words))
+
+
+def seed(
+    users: int = 10,
+    notes: int = 1000,
+    files: int = 200,
+    downloads: int = 2000,
+    blobs: int = 50,
+    blob_size: int = 64 * 1024,
+    seed_value: int = 1,
+) -> dict:
+    """Fill an empty database with synthetic rows, must run inside an app context.
+
+    Rows are inserted with executemany so that seeding 1M notes stays practical,
+    files share `blobs` distinct on-disk blobs of `blob_size` random bytes.
+    """
+    from app import db, blob_store
+    from app.models import Blob, Download, File, Note, User
+    from app.utils import render_markdown
+
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "username": f"bench{index}",
+                "email": f"bench{index}@example.com",
+                "password_hash": password_hash,
+            }
+            for index in range(users)
+        ],
+    )
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+
+    for start in range(0, notes, 10000):
+        db.session.execute(
+            insert(Note),
+            [
+                {
+                    "title": _text(rng, 4),
+                    "content": content,
+                    "content_html": render_markdown(content),
+                    "date_posted": now - timedelta(seconds=index),
+                    "user_id": rng.choice(user_ids + [None]),
+                    "private": rng.random() < 0.3,
+                }
+                for index, content in (
+                    (index, _text(rng, 60))
+                    for index in range(start, min(start + 10000, notes))
+                )
+            ],
+        )
+
+    stored = []
+    for _ in range(blobs):
+        content_hash, size = blob_store.store_stream(io.BytesIO(os.urandom(blob_size)))
+        stored.append((content_hash, size))
+    references = {}
+    file_rows = []
+    for index in range(files):
+        content_hash, size = rng.choice(stored)
+        references[content_hash] = references.get(content_hash, 0) + 1
+        file_rows.append(
+            {
+                "file_name": f"bench_{index}.{rng.choice(['txt', 'pdf', 'png'])}",
+                "date_posted": now - timedelta(seconds=index),
+                "user_id": rng.choice(user_ids + [None]),
+                "private": rng.random() < 0.3,
+                "details": _text(rng, 8),
+                "file_size": size,
+                "content_hash": content_hash,
+            }
+        )
+    db.session.execute(
+        insert(Blob),
+        [
+            {"sha256": content_hash, "size": size, "refcount": references[content_hash]}
+            for content_hash, size in stored
+            if content_hash in references
+        ],
+    )
+    for row in file_rows:
+        row["file_type"] = File.type_from_name(row["file_name"])
+    db.session.execute(insert(File), file_rows)
+    file_ids = [file_id for (file_id,) in db.session.query(File.id)]
+
+    for start in range(0, downloads, 10000):
+        rows = [
+            {
+                "file_id": rng.choice(file_ids),
+                "user_id": rng.choice(user_ids + [None]),
+                "download_date": now - timedelta(minutes=rng.randrange(7 * 24 * 60)),
+            }
+            for _ in range(start, min(start + 10000, downloads))
+        ]
+        db.session.execute(insert(Download), rows)
+        Download.after_audit_flush(rows)
+    db.session.commit()
+    return {
+        "users": users,
+        "notes": notes,
+        "files": files,
+        "downloads": downloads,
+        "blobs": blobs,
+        "blob_size": blob_size,
+    }
@@ -0,0 +1,138 @@
+"""Measure cold start: importing the app, building it and its first request.
+
+    python -m benchmarks.startup --samples 10 --first-request-budget-ms 100
+
+Each sample runs in a fresh interpreter. Import time comes from
+`python -X importtime`, so it excludes interpreter startup. Exits non-zero
+when a median is over its budget, pass 0 to skip a budget.
+"""
+
+import argparse, os, statistics, subprocess, sys, tempfile
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_create_app = """
+import time
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get("/api/notes")
+assert response.status_code == 200, response.status_code
+print((created - start) * 1000, (time.perf_counter() - created) * 1000)
+"""
+
+_init_db = """
+from app import create_app
+from app.commands import init_db
+with create_app().app_context():
+    init_db()
+"""
+
+# defaults leave headroom over a laptop or CI runner, a regression such as an
+# eager heavy import or queries at startup still goes over them
+_import_budget_ms = 1000
+_create_budget_ms = 1500
+_first_request_budget_ms = 250
+
+
+def _environment(workdir: str) -> dict:
+    environ = dict(os.environ)
+    environ.setdefault("SECRET_KEY", "benchmark")
+    environ.setdefault("UPLOAD_FOLDER", os.path.join(workdir, "uploads"))
+    if not environ.get("DATABASE_URL_POSTGRES"):
+        environ.setdefault(
+            "DATABASE_URL_SQLITE", "sqlite:///" + os.path.join(workdir, "bench.db")
+        )
+    return environ
+
+
+def import_time_ms(environ: dict) -> tuple:
+    """Cumulative import time of the app package and of its direct imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=_root,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.append((int(cumulative), name.rstrip()))
+    total = next(us for us, name in modules if name.strip() == "app")
+    # nesting is shown by indentation, the least indented ones are imported by app
+    direct = [
+        (us, name.strip())
+        for us, name in modules
+        if name.startswith("   ") and not name.startswith("     ")
+    ]
+    return total / 1000, sorted(direct, reverse=True)[:10]
+
+
+def create_app_ms(environ: dict) -> tuple:
+    """create_app() including the import, and the first request after it."""
+    result = subprocess.run(
+        [sys.executable, "-c", _create_app],
+        cwd=_root,
+        env=environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    create_ms, request_ms = result.stdout.strip().splitlines()[-1].split()
+    return float(create_ms), float(request_ms)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=_import_budget_ms)
+    parser.add_argument("--create-budget-ms", type=float, default=_create_budget_ms)
+    parser.add_argument(
+        "--first-request-budget-ms", type=float, default=_first_request_budget_ms
+    )
+    args = parser.parse_args(argv)
+
+    environ = _environment(tempfile.mkdtemp(prefix="notes-startup-"))
+    subprocess.run([sys.executable, "-c", _init_db], cwd=_root, env=environ, check=True)
+    imports, creates, requests, slowest = [], [], [], []
+    for _ in range(args.samples):
+        total, slowest = import_time_ms(environ)
+        imports.append(total)
+        create_ms, request_ms = create_app_ms(environ)
+        creates.append(create_ms)
+        requests.append(request_ms)
+    import_ms = statistics.median(imports)
+    create_ms = statistics.median(creates)
+    request_ms = statistics.median(requests)
+
+    print(f"import app      {import_ms:8.1f} ms (median of {args.samples})")
+    print(f"create_app()    {create_ms:8.1f} ms (includes the import)")
+    print(f"first request   {request_ms:8.1f} ms (GET /api/notes)")
+    print("slowest imports made by app:")
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if args.import_budget_ms and import_ms > args.import_budget_ms:
+        print(f"import is over the budget of {args.import_budget_ms} ms")
+        failed = True
+    if args.create_budget_ms and create_ms > args.create_budget_ms:
+        print(f"create_app is over the budget of {args.create_budget_ms} ms")
+        failed = True
+    if args.first_request_budget_ms and request_ms > args.first_request_budget_ms:
+        print(
+            f"the first request is over the budget of "
+            f"{args.first_request_budget_ms} ms"
+        )
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
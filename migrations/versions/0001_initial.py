@@ -0,0 +1,355 @@
+"""Initial schema and indexes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:15:07.168257
+
+Databases created by db.create_all() before migrations existed are adopted:
+missing tables and columns are added, then every index is built if missing.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+metadata = sa.MetaData()
+
+sa.Table(
+    "blob",
+    metadata,
+    sa.Column("sha256", sa.String(length=64), primary_key=True),
+    sa.Column("size", sa.BigInteger(), nullable=False),
+    sa.Column("refcount", sa.Integer(), nullable=False),
+    sa.Column("created", sa.DateTime(), nullable=False),
+)
+sa.Table(
+    "revoked_token",
+    metadata,
+    sa.Column("jti", sa.String(length=32), primary_key=True),
+    sa.Column("expires", sa.DateTime(), nullable=False),
+)
+sa.Table(
+    "user",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("username", sa.String(length=20), nullable=False, unique=True),
+    sa.Column("email", sa.String(length=120), nullable=True, unique=True),
+    sa.Column("password_hash", sa.String(length=120), nullable=False),
+)
+sa.Table(
+    "file",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("date_posted", sa.DateTime(), nullable=False),
+    sa.Column("last_downloaded", sa.DateTime(), nullable=True),
+    sa.Column("download_count", sa.Integer(), server_default="0", nullable=False),
+    sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=True),
+    sa.Column("file_name", sa.String(length=100), nullable=True),
+    sa.Column("file_size_bytes", sa.BigInteger(), nullable=True),
+    sa.Column("file_type", sa.String(length=100), nullable=True),
+    sa.Column(
+        "content_hash",
+        sa.String(length=64),
+        sa.ForeignKey("blob.sha256", ondelete="NO ACTION"),
+        nullable=True,
+    ),
+    sa.Column("deleted", sa.Boolean(), nullable=False),
+    sa.Column("date_deleted", sa.DateTime(), nullable=True),
+    sa.Column("private", sa.Boolean(), nullable=False),
+    sa.Column("details", sa.String(length=200), nullable=True),
+)
+sa.Table(
+    "group",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("name", sa.String(length=100), nullable=False),
+    sa.Column("private", sa.Boolean(), nullable=False),
+    sa.Column(
+        "user_id",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="SET NULL"),
+        nullable=True,
+    ),
+)
+sa.Table(
+    "note",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("title", sa.String(length=100), nullable=True),
+    sa.Column("content", sa.Text(), nullable=True),
+    sa.Column("content_html", sa.Text(), nullable=True),
+    sa.Column("date_posted", sa.DateTime(), nullable=False),
+    sa.Column(
+        "user_id",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="NO ACTION"),
+        nullable=True,
+    ),
+    sa.Column("private", sa.Boolean(), nullable=False),
+)
+sa.Table(
+    "upload_session",
+    metadata,
+    sa.Column("id", sa.String(length=32), primary_key=True),
+    sa.Column("created", sa.DateTime(), nullable=False),
+    sa.Column(
+        "user_id",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=True,
+    ),
+    sa.Column("file_name", sa.String(length=100), nullable=False),
+    sa.Column("total_size", sa.BigInteger(), nullable=True),
+    sa.Column("received", sa.BigInteger(), nullable=False),
+    sa.Column("private", sa.Boolean(), nullable=False),
+    sa.Column("details", sa.String(length=200), nullable=True),
+)
+sa.Table(
+    "bookmark",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("date_posted", sa.DateTime(), nullable=False),
+    sa.Column("title", sa.String(length=100), nullable=False),
+    sa.Column("href", sa.Text(), nullable=False),
+    sa.Column("details", sa.String(length=100), nullable=True),
+    sa.Column("private", sa.Boolean(), nullable=False),
+    sa.Column(
+        "user_id",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="SET NULL"),
+        nullable=True,
+    ),
+    sa.Column(
+        "group_id",
+        sa.Integer(),
+        sa.ForeignKey("group.id", ondelete="No ACTION"),
+        nullable=True,
+    ),
+)
+sa.Table(
+    "deletion",
+    metadata,
+    sa.Column("deletion_date", sa.DateTime(), nullable=False),
+    sa.Column(
+        "deleted_by",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="NO ACTION"),
+        primary_key=True,
+    ),
+    sa.Column(
+        "file_deleted",
+        sa.Integer(),
+        sa.ForeignKey("file.id", ondelete="NO ACTION"),
+        primary_key=True,
+    ),
+    sa.Column("reason_deleted", sa.String(length=1000), nullable=True),
+)
+sa.Table(
+    "download",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("download_date", sa.DateTime(), nullable=False),
+    sa.Column(
+        "user_id",
+        sa.Integer(),
+        sa.ForeignKey("user.id", ondelete="SET NULL"),
+        nullable=True,
+    ),
+    sa.Column(
+        "file_id",
+        sa.Integer(),
+        sa.ForeignKey("file.id", ondelete="NO ACTION"),
+        nullable=False,
+    ),
+)
+sa.Table(
+    "download_rollup",
+    metadata,
+    sa.Column(
+        "file_id",
+        sa.Integer(),
+        sa.ForeignKey("file.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    sa.Column("bucket", sa.DateTime(), primary_key=True),
+    sa.Column("count", sa.Integer(), nullable=False),
+)
+sa.Table(
+    "upload",
+    metadata,
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("upload_date", sa.DateTime(), nullable=False),
+    sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=True),
+    sa.Column(
+        "file_id",
+        sa.Integer(),
+        sa.ForeignKey("file.id", ondelete="NO ACTION"),
+        nullable=False,
+    ),
+)
+
+# name, table, columns
+INDEXES = [
+    ("ix_revoked_token_expires", "revoked_token", ["expires"]),
+    ("ix_file_content_hash", "file", ["content_hash"]),
+    (
+        "ix_file_deleted_private_date_posted",
+        "file",
+        ["deleted", "private", "date_posted"],
+    ),
+    ("ix_file_file_name", "file", ["file_name"]),
+    ("ix_file_file_size_bytes", "file", ["file_size_bytes"]),
+    ("ix_file_user_id", "file", ["user_id"]),
+    ("ix_note_date_posted_id", "note", ["date_posted", "id"]),
+    ("ix_note_private_date_posted", "note", ["private", "date_posted"]),
+    ("ix_note_user_id", "note", ["user_id"]),
+    ("ix_upload_session_created", "upload_session", ["created"]),
+    ("ix_download_file_id", "download", ["file_id"]),
+    ("ix_download_rollup_bucket", "download_rollup", ["bucket", "file_id"]),
+    ("ix_upload_file_id", "upload", ["file_id"]),
+]
+
+# full text search as of this revision: table -> (fts5 table or GIN index, columns).
+# spelled out here so the migration does not change with app.search
+SEARCH_INDEXES = {
+    "note": ("note_fts", ("title", "content")),
+    "file": ("file_fts", ("file_name", "details")),
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            table.create(bind)
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                # sqlite cannot add a constraint to an existing table, the
+                # column is added without its foreign key
+                op.add_column(
+                    table.name,
+                    sa.Column(
+                        column.name,
+                        column.type,
+                        nullable=column.nullable,
+                        server_default=column.server_default
+                        and column.server_default.arg,
+                    ),
+                )
+
+    if bind.dialect.name != "postgresql":
+        for name, table_name, columns in INDEXES:
+            op.create_index(name, table_name, columns, if_not_exists=True)
+        _create_search_indexes(bind)
+        return
+    # existing tables can be large, build the indexes without blocking writes.
+    # CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        _drop_invalid_indexes(bind)
+        for name, table_name, columns in INDEXES:
+            op.create_index(
+                name,
+                table_name,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+        _create_search_indexes(bind, concurrently=True)
+
+
+def _search_backend(bind) -> str:
+    # sqlite gets fts5 virtual tables when compiled with them, postgres GIN indexes
+    if bind.dialect.name == "sqlite":
+        options = bind.exec_driver_sql("PRAGMA compile_options").all()
+        if any(option[0] == "ENABLE_FTS5" for option in options):
+            return "fts5"
+    elif bind.dialect.name == "postgresql":
+        return "tsvector"
+    return None
+
+
+def _create_search_indexes(bind, concurrently: bool = False):
+    backend = _search_backend(bind)
+    for table_name, (fts_name, columns) in SEARCH_INDEXES.items():
+        if backend == "fts5":
+            _create_fts5_index(bind, table_name, fts_name, columns)
+        elif backend == "tsvector":
+            # the expression app.search queries with, or the index is not used
+            document = " || ' ' || ".join(f"coalesce({name}, '')" for name in columns)
+            bind.exec_driver_sql(
+                f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}"
+                f"IF NOT EXISTS ix_{fts_name} ON {table_name} "
+                f"USING GIN (to_tsvector('simple', {document}))"
+            )
+
+
+def _create_fts5_index(bind, table_name: str, fts_name: str, columns):
+    exists = bind.execute(
+        sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": fts_name},
+    ).first()
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{name}" for name in columns)
+    old_values = ", ".join(f"old.{name}" for name in columns)
+    bind.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5("
+        f"{names}, content='{table_name}', content_rowid='id', prefix='2 3')"
+    )
+    bind.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ai AFTER INSERT ON {table_name} "
+        f"BEGIN INSERT INTO {fts_name}(rowid, {names}) VALUES (new.id, {new_values}); END"
+    )
+    bind.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ad AFTER DELETE ON {table_name} "
+        f"BEGIN INSERT INTO {fts_name}({fts_name}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old_values}); END"
+    )
+    bind.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_name}_au AFTER UPDATE OF {names} "
+        f"ON {table_name} "
+        f"BEGIN INSERT INTO {fts_name}({fts_name}, rowid, {names}) "
+        f"VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts_name}(rowid, {names}) VALUES (new.id, {new_values}); END"
+    )
+    if exists is None:
+        # index whatever was stored before the virtual table existed
+        bind.exec_driver_sql(f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')")
+
+
+def _drop_search_indexes(bind):
+    backend = _search_backend(bind)
+    for fts_name, _ in SEARCH_INDEXES.values():
+        if backend == "fts5":
+            for suffix in ("ai", "ad", "au"):
+                bind.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts_name}_{suffix}")
+            bind.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_name}")
+        elif backend == "tsvector":
+            bind.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{fts_name}")
+
+
+def _drop_invalid_indexes(bind):
+    # a concurrent build that failed leaves an invalid index behind, which
+    # IF NOT EXISTS would otherwise keep
+    names = bind.exec_driver_sql(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid"
+    ).scalars()
+    wanted = {name for name, _, _ in INDEXES}
+    wanted |= {f"ix_{fts_name}" for fts_name, _ in SEARCH_INDEXES.values()}
+    for name in set(names) & wanted:
+        bind.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def downgrade():
+    bind = op.get_bind()
+    _drop_search_indexes(bind)
+    for table in reversed(metadata.sorted_tables):
+        op.drop_table(table.name)
@@ -0,0 +1,65 @@
+"""Index the listings of a user's notes and files
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:23:47.091355
+
+The composite indexes start with user_id, so they replace the single column
+user_id indexes, which are dropped once the new ones exist.
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# name, table, columns
+ADDED = [
+    ("ix_note_user_id_date_posted", "note", ["user_id", "date_posted", "id"]),
+    (
+        "ix_file_user_id_deleted_date_posted",
+        "file",
+        ["user_id", "deleted", "date_posted", "id"],
+    ),
+]
+REPLACED = [
+    ("ix_note_user_id", "note", ["user_id"]),
+    ("ix_file_user_id", "file", ["user_id"]),
+]
+
+
+def _swap(create: list, drop: list) -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        for name, table_name, columns in create:
+            op.create_index(name, table_name, columns, if_not_exists=True)
+        for name, table_name, _ in drop:
+            op.drop_index(name, table_name=table_name, if_exists=True)
+        return
+    # build and drop without blocking writes, CONCURRENTLY cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table_name, columns in create:
+            op.create_index(
+                name,
+                table_name,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+        for name, table_name, _ in drop:
+            op.drop_index(
+                name,
+                table_name=table_name,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def upgrade():
+    _swap(ADDED, REPLACED)
+
+
+def downgrade():
+    _swap(REPLACED, ADDED)
@@ -0,0 +1,36 @@
+"""Store the admin flag of users
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:31:52.608113
+
+User.is_admin was shadowed by the is_admin() method, so the column was never
+created and every user counted as an admin. The first user registered was
+told they are the admin, so they keep the flag.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "is_admin", sa.Boolean(), nullable=False, server_default=sa.false()
+            )
+        )
+    user = sa.table("user", sa.column("id"), sa.column("is_admin"))
+    first = sa.select(sa.func.min(user.c.id)).scalar_subquery()
+    op.execute(user.update().where(user.c.id == first).values(is_admin=True))
+
+
+def downgrade():
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.drop_column("is_admin")
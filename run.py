@@ -1,7 +1,14 @@
-from app import app
+from app import create_app
+from app.commands import init_db
+import os
 
 if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        init_db()
+    # development server only, use `flask serve` in production
     app.run(
-        host="127.0.0.1", port=5000, debug=True
-    )  # debug=True is only for development
-    # app.run()
+        host="127.0.0.1",
+        port=5000,
+        debug=os.environ.get("FLASK_DEBUG", "0") in ("1", "true", "True"),
+    )
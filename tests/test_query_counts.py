@@ -0,0 +1,82 @@
+"""The listing endpoints run the same number of statements however many rows
+they return, a query per row (N+1) shows up as a count that grows.
+
+    python -m pytest tests
+"""
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import create_app
+from app.commands import init_db
+from app.utils import Settings
+from benchmarks.seed import PASSWORD, seed
+
+# rows per page, larger than the small dataset so every row is listed
+LIMIT = 50
+
+
+def _make_app(folder, users: int, notes: int, files: int):
+    settings = Settings.from_env(
+        {
+            "DATABASE_URL_SQLITE": f"sqlite:///{folder / 'notes.db'}",
+            "UPLOAD_FOLDER": str(folder / "uploads"),
+            "SECRET_KEY": "test",
+            # every request has to reach the database
+            "CACHE_BACKEND": "none",
+            "USER_CACHE_TTL": "0",
+            "AUDIT_ASYNC": "0",
+        }
+    )
+    app = create_app(settings, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        init_db()
+        seed(users=users, notes=notes, files=files, downloads=files * 2, blobs=3)
+    return app
+
+
+def _count_statements(app, url: str, signed_in: bool) -> tuple:
+    # (statements run, rows listed) for one request
+    client = app.test_client()
+    if signed_in:
+        response = client.post(
+            "/api/login",
+            json={"username": "bench0", "password": PASSWORD, "remember_me": False},
+        )
+        assert response.status_code == 200
+    count = 0
+
+    def counter(*args) -> None:
+        nonlocal count
+        count += 1
+
+    event.listen(Engine, "before_cursor_execute", counter)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter)
+    assert response.status_code == 200
+    (rows,) = (
+        value for value in response.get_json().values() if isinstance(value, list)
+    )
+    return count, len(rows)
+
+
+@pytest.fixture(scope="module")
+def apps(tmp_path_factory):
+    # authors grow with the rows, otherwise lazy loads hit the identity map
+    small = _make_app(tmp_path_factory.mktemp("small"), users=2, notes=5, files=5)
+    large = _make_app(tmp_path_factory.mktemp("large"), users=100, notes=300, files=150)
+    return small, large
+
+
+@pytest.mark.parametrize("signed_in", [False, True], ids=["anonymous", "user"])
+@pytest.mark.parametrize(
+    "url", [f"/api/notes?limit={LIMIT}", f"/api/files?limit={LIMIT}"]
+)
+def test_statement_count_does_not_grow_with_rows(apps, url, signed_in):
+    small, large = apps
+    small_count, small_rows = _count_statements(small, url, signed_in)
+    large_count, large_rows = _count_statements(large, url, signed_in)
+    assert small_rows < large_rows == LIMIT
+    assert small_count == large_count